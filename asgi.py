@@ -0,0 +1,13 @@
+"""
+Asynchronous Server Gateway Interface (ASGI) entry point
+
+Serves the Order reads on an event loop and hands everything else to
+the Flask app of wsgi.py. Run it with an ASGI server, e.g.
+
+    uvicorn asgi:app --port 8080
+"""
+
+from wsgi import app as flask_app
+from service.asgi import AsgiApp
+
+app = AsgiApp(flask_app)
@@ -0,0 +1,5 @@
+"""
+Benchmarks for the Orders service
+
+Each module can be run on its own, e.g. ``python -m benchmarks.bench_serializers``
+"""
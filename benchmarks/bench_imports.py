@@ -0,0 +1,61 @@
+"""
+Benchmark: import time of the service against its budget
+
+Imports a module (``wsgi`` by default, which also creates the app) in a
+fresh interpreter with ``python -X importtime`` and reports the total
+and the slowest modules. The schema step is turned off, so no database
+is needed. Exits with status 1 when the total is over the budget.
+
+Usage:
+    python -m benchmarks.bench_imports [--module wsgi] [--budget 1.0] [--top 15]
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+DEFAULT_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "1.0"))
+
+
+def parse(report: str) -> dict:
+    """Returns the cumulative import time in seconds of each module in an -X importtime report"""
+    times = {}
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        times[name] = max(times.get(name, 0.0), int(cumulative) / 1_000_000)
+    return times
+
+
+def run(module: str = "wsgi") -> dict:
+    """Imports module in a new interpreter and returns its import times and the modules it loaded"""
+    env = dict(os.environ, SCHEMA_MODE="off")
+    code = f"import sys, {module}; print(','.join(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], env=env, capture_output=True, text=True, check=True
+    )
+    times = parse(result.stderr)
+    return {"total": times[module], "times": times, "modules": set(result.stdout.strip().split(","))}
+
+
+def main():
+    """Runs the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="wsgi")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    result = run(args.module)
+    slowest = sorted(result["times"].items(), key=lambda item: item[1], reverse=True)
+    print(f"import {args.module}: {result['total'] * 1000:8.1f} ms (budget {args.budget * 1000:.0f} ms)")
+    for name, seconds in slowest[1:args.top + 1]:
+        print(f"  {name:45} {seconds * 1000:8.1f} ms")
+    if result["total"] > args.budget:
+        print("Over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""
+Benchmark: end-to-end load test of the API
+
+Drives the service with a weighted mix of the real endpoints: listing
+orders by customer or status, getting an order, creating one (with a few
+items), adding an item and cancelling an order. The orders it works on
+are seeded through the API from the test factories first. The target is
+either the app in this process, through the Flask test client (it needs
+the DATABASE_URI of a database it may write to), or a running server
+such as a local gunicorn with --url.
+
+With --concurrency workers sending requests back to back (a closed
+loop) it measures what the server can sustain; with --rps it sends
+requests at that rate whatever the server does (an open loop) and times
+each from when it was due, so a server falling behind shows up in the
+latencies instead of slowing the test down. The report gives, overall
+and per operation, the requests, throughput, error rate and the p50,
+p95 and p99 latencies; --output writes it as JSON.
+
+Usage:
+    python -m benchmarks.bench_load [--url http://localhost:8080] [--duration 30] [--concurrency 8]
+        [--rps 0] [--seed-orders 200] [--mix list=30,get=40,create=10,add_item=15,cancel=5] [--output load.json]
+"""
+import json
+import math
+import queue
+import random
+import argparse
+import threading
+import http.client
+from collections import deque
+from time import perf_counter, sleep
+from urllib.parse import urlsplit
+from service.common.order_status import Status
+from tests.factories import OrderFactory, OrderItemFactory
+
+BASE_URL = "/api/orders"
+DEFAULT_MIX = {"list": 30, "get": 40, "create": 10, "add_item": 15, "cancel": 5}
+
+
+######################################################################
+#  T A R G E T S
+######################################################################
+class InProcessClient:  # pylint: disable=too-few-public-methods
+    """Sends requests to the app in this process through the Flask test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method: str, path: str, body=None) -> tuple:
+        """Returns the status and the decoded JSON body of a request"""
+        resp = self.client.open(path, method=method, json=body)
+        return resp.status_code, resp.get_json(silent=True)
+
+
+class HttpClient:  # pylint: disable=too-few-public-methods
+    """Sends requests to a server over one kept-alive HTTP connection"""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = None
+
+    def request(self, method: str, path: str, body=None) -> tuple:
+        """Returns the status and the decoded JSON body of a request"""
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        headers = {"Accept": "application/json"}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        try:
+            self.connection.request(method, path, payload, headers)
+            resp = self.connection.getresponse()
+            data = resp.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None  # reconnect on the next request
+            raise
+        return resp.status, json.loads(data) if data and "json" in resp.getheader("Content-Type", "") else None
+
+
+def client_factory(url: str = None):
+    """Returns a function that makes a client for each worker"""
+    if url:
+        return lambda: HttpClient(url)
+    from wsgi import app  # pylint: disable=import-outside-toplevel
+
+    return lambda: InProcessClient(app)
+
+
+######################################################################
+#  D A T A S E T
+######################################################################
+class Dataset:
+    """The orders the operations work on, shared by the workers"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.orders = []  # (id, customer_id)
+        self.cancellable = deque()  # ids of orders still CREATED
+
+    def add(self, order_id: int, customer_id: str, cancellable: bool):
+        """Adds an order the API created"""
+        with self.lock:
+            self.orders.append((order_id, customer_id))
+            if cancellable:
+                self.cancellable.append(order_id)
+
+    def pick(self, rng: random.Random) -> tuple:
+        """Returns the id and customer of a random order"""
+        with self.lock:
+            return rng.choice(self.orders)
+
+    def take_cancellable(self):
+        """Returns the id of an order to cancel, or None when there is none left"""
+        with self.lock:
+            return self.cancellable.popleft() if self.cancellable else None
+
+
+def order_document(items: int, order_status: Status = Status.CREATED) -> dict:
+    """Returns the JSON document of a new Order with items OrderItems, built by the factories"""
+    order = OrderFactory.build(status=order_status)
+    OrderItemFactory.build_batch(items, order=order)
+    document = order.serialize()
+    for key in ("id", "created_at", "updated_at"):
+        del document[key]
+    for item in document["orderitem"]:
+        del item["id"]
+    return document
+
+
+def seed(client, dataset: Dataset, orders: int, items: int, rng: random.Random):
+    """Creates orders through the API; about half of them stay cancellable"""
+    for _ in range(orders):
+        order_status = Status.CREATED if rng.random() < 0.5 else rng.choice(list(Status))
+        code, body = client.request("POST", BASE_URL, order_document(items, order_status))
+        if code != 201:
+            raise RuntimeError(f"Seeding failed with {code}: {body}")
+        dataset.add(body["id"], body["customer_id"], order_status == Status.CREATED)
+
+
+######################################################################
+#  O P E R A T I O N S
+######################################################################
+# Each sends one request and returns its status and the statuses that are not errors
+
+def op_list(client, dataset, rng) -> tuple:
+    """Lists the orders of a customer, or those in a status"""
+    if rng.random() < 0.5:
+        query = f"customer_id={dataset.pick(rng)[1]}"
+    else:
+        query = f"status={rng.choice(list(Status)).name}"
+    return client.request("GET", f"{BASE_URL}?{query}")[0], (200,)
+
+
+def op_get(client, dataset, rng) -> tuple:
+    """Gets an order"""
+    return client.request("GET", f"{BASE_URL}/{dataset.pick(rng)[0]}")[0], (200,)
+
+
+def op_create(client, dataset, rng) -> tuple:
+    """Creates an order with a few items"""
+    code, body = client.request("POST", BASE_URL, order_document(rng.randint(1, 5)))
+    if code == 201:
+        dataset.add(body["id"], body["customer_id"], True)
+    return code, (201,)
+
+
+def op_add_item(client, dataset, rng) -> tuple:
+    """Adds an item to an order"""
+    item = {"product_id": f"SKU{rng.randint(0, 99999):05d}", "price": f"{rng.uniform(1, 100):.2f}",
+            "quantity": rng.randint(1, 10)}
+    return client.request("POST", f"{BASE_URL}/{dataset.pick(rng)[0]}/orderitems", item)[0], (201,)
+
+
+def op_cancel(client, dataset, rng) -> tuple:
+    """Cancels an order still CREATED, or creates one when none is left"""
+    order_id = dataset.take_cancellable()
+    if order_id is None:
+        return op_create(client, dataset, rng)
+    return client.request("PUT", f"{BASE_URL}/{order_id}/cancel")[0], (200,)
+
+
+OPERATIONS = {
+    "list": op_list,
+    "get": op_get,
+    "create": op_create,
+    "add_item": op_add_item,
+    "cancel": op_cancel,
+}
+
+
+def parse_mix(text: str) -> dict:
+    """Parses weights given as "operation=weight,..." """
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name.strip()!r}; choose from {', '.join(OPERATIONS)}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+######################################################################
+#  R E S U L T S
+######################################################################
+class Recorder:  # pylint: disable=too-few-public-methods
+    """Collects the latency and outcome of every request"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {name: [] for name in OPERATIONS}
+        self.errors = {name: {} for name in OPERATIONS}
+
+    def record(self, name: str, seconds: float, error: str = None):
+        """Adds a request that took seconds and failed with error, if any"""
+        with self.lock:
+            self.latencies[name].append(seconds)
+            if error:
+                self.errors[name][error] = self.errors[name].get(error, 0) + 1
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    """Returns the nearest-rank percentile of a sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered), max(1, math.ceil(fraction * len(ordered)))) - 1]
+
+
+def summarize(latencies: list, errors: dict, seconds: float) -> dict:
+    """Returns the throughput, error rate and latency percentiles of some requests"""
+    ordered = sorted(latencies)
+    failed = sum(errors.values())
+    return {
+        "requests": len(ordered),
+        "throughput": len(ordered) / seconds if seconds else 0.0,
+        "errors": failed,
+        "error_rate": failed / len(ordered) if ordered else 0.0,
+        "error_kinds": dict(errors),
+        "p50": percentile(ordered, 0.50),
+        "p95": percentile(ordered, 0.95),
+        "p99": percentile(ordered, 0.99),
+        "max": ordered[-1] if ordered else 0.0,
+    }
+
+
+def report(recorder: Recorder, seconds: float, settings: dict) -> dict:
+    """Returns the summary of the run, overall and per operation"""
+    everything = [latency for latencies in recorder.latencies.values() for latency in latencies]
+    all_errors = {}
+    for errors in recorder.errors.values():
+        for kind, count in errors.items():
+            all_errors[kind] = all_errors.get(kind, 0) + count
+    return {
+        "settings": settings,
+        "seconds": seconds,
+        "total": summarize(everything, all_errors, seconds),
+        "operations": {
+            name: summarize(latencies, recorder.errors[name], seconds)
+            for name, latencies in recorder.latencies.items() if latencies
+        },
+    }
+
+
+######################################################################
+#  R U N N I N G
+######################################################################
+def _send(job: tuple, client, dataset: Dataset, rng: random.Random, recorder: Recorder):
+    """Runs the operation of a (name, due) job and records its latency from when it was due"""
+    name, due = job
+    try:
+        code, expected = OPERATIONS[name](client, dataset, rng)
+        error = None if code in expected else f"HTTP {code}"
+    except Exception as exc:  # pylint: disable=broad-except
+        error = type(exc).__name__
+    recorder.record(name, perf_counter() - due, error)
+
+
+def _closed_loop(make_client, dataset, recorder, mix, args):
+    """Each worker sends its next request as soon as the last one is answered"""
+    deadline = perf_counter() + args.duration
+    names, weights = list(mix), list(mix.values())
+
+    def worker(index: int):
+        client, rng = make_client(), random.Random(args.random_seed + index)
+        while perf_counter() < deadline:
+            _send((rng.choices(names, weights)[0], perf_counter()), client, dataset, rng, recorder)
+
+    return [threading.Thread(target=worker, args=(index,)) for index in range(args.concurrency)]
+
+
+def _open_loop(make_client, dataset, recorder, mix, args):
+    """Requests fall due at --rps; the workers take them in turn"""
+    due = queue.Queue()
+    names, weights = list(mix), list(mix.values())
+
+    def schedule():
+        rng = random.Random(args.random_seed)
+        started = perf_counter()
+        for sent in range(int(args.rps * args.duration)):
+            at = started + sent / args.rps
+            sleep(max(0.0, at - perf_counter()))
+            due.put((rng.choices(names, weights)[0], at))
+        for _ in range(args.concurrency):
+            due.put(None)
+
+    def worker(index: int):
+        client, rng = make_client(), random.Random(args.random_seed + index)
+        for job in iter(due.get, None):
+            _send(job, client, dataset, rng, recorder)
+
+    return [threading.Thread(target=schedule)] + [
+        threading.Thread(target=worker, args=(index,)) for index in range(args.concurrency)
+    ]
+
+
+def run(args, make_client=None) -> dict:
+    """Seeds the orders, runs the load and returns the report"""
+    make_client = make_client or client_factory(args.url)
+    mix = parse_mix(args.mix) if isinstance(args.mix, str) else dict(args.mix)
+    dataset, recorder = Dataset(), Recorder()
+    seed(make_client(), dataset, args.seed_orders, args.items, random.Random(args.random_seed))
+    threads = (_open_loop if args.rps else _closed_loop)(make_client, dataset, recorder, mix, args)
+    started = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    settings = {
+        "target": args.url or "in-process", "duration": args.duration, "concurrency": args.concurrency,
+        "rps": args.rps, "mix": mix, "seed_orders": args.seed_orders,
+    }
+    return report(recorder, perf_counter() - started, settings)
+
+
+def parser_for() -> argparse.ArgumentParser:
+    """Returns the command line parser, whose defaults run() also takes"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="a running server, e.g. http://localhost:8080; the app in-process if left out")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--concurrency", type=int, default=8, help="workers sending requests")
+    parser.add_argument("--rps", type=float, default=0.0, help="send at this rate instead of back to back")
+    parser.add_argument("--seed-orders", type=int, default=200)
+    parser.add_argument("--items", type=int, default=3, help="items of each seeded order")
+    parser.add_argument("--mix", default=",".join(f"{name}={weight}" for name, weight in DEFAULT_MIX.items()))
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    return parser
+
+
+def main():
+    """Runs the load test from the command line"""
+    args = parser_for().parse_args()
+    result = run(args)
+    print(f"{result['settings']['target']}: {result['seconds']:.1f}s, concurrency {args.concurrency}"
+          + (f", {args.rps:g} rps offered" if args.rps else ""))
+    print(f"{'operation':<10} {'requests':>9} {'req/s':>9} {'errors':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in [*result["operations"].items(), ("total", result["total"])]:
+        print(f"{name:<10} {stats['requests']:>9} {stats['throughput']:>9.1f} {stats['error_rate']:>7.1%} "
+              f"{stats['p50'] * 1000:>9.2f} {stats['p95'] * 1000:>9.2f} {stats['p99'] * 1000:>9.2f}")
+    if result["total"]["error_kinds"]:
+        print("errors:", ", ".join(f"{kind} x{count}" for kind, count in result["total"]["error_kinds"].items()))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
+            file.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: logging overhead per request on the request thread
+
+Logs what a write request logs (a lookup by id and "Updating <Order>")
+through init_logging() and times the calls on the calling thread for
+each logging mode: text or JSON, written in place or handed to the
+queue's background thread, and with the lookups sampled. Each mode
+writes to /dev/null and to a sink that blocks for --sink-latency seconds
+per write, like a pipe to a log collector that falls behind. No
+database is needed.
+
+Usage:
+    python -m benchmarks.bench_logging [--requests 5000] [--sample 10] [--sink-latency 0.0001]
+"""
+import os
+import atexit
+import logging
+import argparse
+from time import perf_counter, sleep
+from flask import Flask
+from service.common.log_handlers import init_logging
+from tests.factories import OrderFactory
+
+GUNICORN_LOGGER = "benchmarks.gunicorn"
+LOOKUP_LOGGER = "flask.app.lookups"
+
+
+class BlockingSink:
+    """A stream whose writes block like a full pipe"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def write(self, text: str) -> int:
+        """Waits, then discards the text"""
+        sleep(self.latency)
+        return len(text)
+
+    def flush(self):
+        """Nothing is buffered"""
+
+
+def modes(sample: int) -> dict:
+    """Returns the settings of each logging mode, sampled last"""
+    return {
+        "text": {},
+        "json": {"LOG_FORMAT": "json"},
+        "text, queue": {"LOG_QUEUE": True},
+        "json, queue": {"LOG_FORMAT": "json", "LOG_QUEUE": True},
+        f"json, queue, 1/{sample} lookups": {
+            "LOG_FORMAT": "json", "LOG_QUEUE": True, "LOG_SAMPLING": {LOOKUP_LOGGER: sample}
+        },
+    }
+
+
+def time_mode(config: dict, requests: int) -> float:
+    """Returns the seconds per request spent logging on the calling thread"""
+    app = Flask("benchmark")
+    app.config.update(config)
+    init_logging(app, GUNICORN_LOGGER)
+    logger, lookups = logging.getLogger("flask.app"), logging.getLogger(LOOKUP_LOGGER)
+    orders = OrderFactory.build_batch(100)
+    started = perf_counter()
+    for i in range(requests):
+        order = orders[i % len(orders)]
+        lookups.info("Processing lookup for id %s ...", order.id)
+        logger.info("Updating %s", order)
+    seconds = perf_counter() - started
+    listener = app.extensions.get("log_listener")
+    if listener:
+        listener.stop()  # drain the queue before the next mode
+        atexit.unregister(listener.stop)
+    return seconds / requests
+
+
+def run(requests: int = 5000, sample: int = 10, sink_latency: float = 0.0001) -> dict:
+    """Times every logging mode into both sinks and returns the seconds per request of each"""
+    gunicorn = logging.getLogger(GUNICORN_LOGGER)
+    gunicorn.setLevel(logging.INFO)
+    result = {}
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        for sink_name, sink in (("devnull", devnull), ("blocking", BlockingSink(sink_latency))):
+            gunicorn.handlers = [logging.StreamHandler(sink)]
+            for name, config in modes(sample).items():
+                result.setdefault(name, {})[sink_name] = time_mode(config, requests)
+    return result
+
+
+def main():
+    """Runs the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--sample", type=int, default=10)
+    parser.add_argument("--sink-latency", type=float, default=0.0001)
+    args = parser.parse_args()
+    result = run(args.requests, args.sample, args.sink_latency)
+    print(f"logging per request ({args.requests} requests, 2 records each)")
+    print(f"  {'mode':32} {'/dev/null':>10} {'blocking':>10}")
+    for name, seconds in result.items():
+        print(f"  {name:32} {seconds['devnull'] * 1e6:8.1f}us {seconds['blocking'] * 1e6:8.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark: the model and serialization hot paths against a baseline
+
+Times, for Orders of 1, 100 and 10,000 items built with the test
+factories (no database needed):
+
+* ``Order.serialize`` and ``Order.deserialize``
+* ``OrderItem.deserialize`` of every item, i.e. parsing the Decimal prices
+* ``Order.total_amount``
+* flask-restx ``marshal`` of ``order_model`` and the compiled serializer
+  the API uses in its place
+
+Each case reports the best of --repeat runs in seconds per call. The
+results are written as JSON with --output, saved as the new baseline
+with --save-baseline, and compared with the stored baseline: a case
+more than --threshold slower than its baseline is a regression, and the
+run exits with status 1. Baselines only compare on the machine that
+recorded them; save one there before comparing.
+
+Usage:
+    python -m benchmarks.bench_models [--sizes 1,100,10000] [--repeat 5] [--output results.json]
+        [--baseline benchmarks/baseline_models.json] [--threshold 0.25] [--save-baseline]
+"""
+import os
+import sys
+import json
+import timeit
+import argparse
+import platform
+from flask import Flask
+from flask_restx import marshal
+from service.api.orders import order_model
+from service.api.serializers import serializer_for
+from service.models import db, Order, OrderItem
+from tests.factories import OrderFactory, OrderItemFactory
+
+DEFAULT_SIZES = (1, 100, 10_000)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline_models.json")
+DEFAULT_THRESHOLD = 0.25
+MIN_SECONDS = 0.05  # time enough calls of a case to fill this, so small cases are not all timer noise
+
+
+def make_order(items: int) -> Order:
+    """Returns a transient Order with items OrderItems"""
+    order = OrderFactory.build()
+    OrderItemFactory.build_batch(items, order=order)
+    return order
+
+
+def cases(items: int) -> dict:
+    """Returns the function to time for each case, for an Order of items items"""
+    order = make_order(items)
+    document = order.serialize()
+    item_documents = document["orderitem"]
+    serializer = serializer_for(order_model)
+    return {
+        "Order.serialize": order.serialize,
+        "Order.deserialize": lambda: Order().deserialize(document),
+        "OrderItem.deserialize": lambda: [OrderItem().deserialize(item) for item in item_documents],
+        "Order.total_amount": lambda: order.total_amount,
+        "marshal order_model": lambda: marshal(order, order_model),
+        "compiled order_model": lambda: serializer(order),
+    }
+
+
+def time_case(function, repeat: int) -> float:
+    """Returns the best seconds per call of function over repeat runs"""
+    timer = timeit.Timer(function)
+    number = 1
+    while timer.timeit(number) < MIN_SECONDS and number < 1_000_000:
+        number *= 10
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(sizes=DEFAULT_SIZES, repeat: int = 5) -> dict:
+    """Times every case at every size and returns the results by "<case>[<items>]" """
+    app = Flask("benchmark")
+    # deserialize only needs a session to hold back autoflush; nothing connects
+    app.config["SQLALCHEMY_DATABASE_URI"] = "postgresql+psycopg://localhost/benchmark"
+    db.init_app(app)
+    results = {}
+    with app.app_context():
+        for items in sizes:
+            for name, function in cases(items).items():
+                results[f"{name}[{items}]"] = time_case(function, repeat)
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """Returns (case, seconds, baseline seconds, ratio) of the cases over threshold slower than the baseline"""
+    regressions = []
+    for case, seconds in results["results"].items():
+        before = baseline["results"].get(case)
+        if before and seconds / before > 1 + threshold:
+            regressions.append((case, seconds, before, seconds / before))
+    return regressions
+
+
+def _load(path: str) -> dict:
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _save(path: str, results: dict):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+        file.write("\n")
+
+
+def main():
+    """Runs the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--save-baseline", action="store_true", help="make these results the baseline")
+    args = parser.parse_args()
+
+    results = run([int(size) for size in args.sizes.split(",")], args.repeat)
+    baseline = _load(args.baseline) if os.path.exists(args.baseline) and not args.save_baseline else None
+    print(f"{'case':<34} {'per call':>12} {'baseline':>12} {'change':>8}")
+    for case, seconds in results["results"].items():
+        before = baseline["results"].get(case) if baseline else None
+        was = f"{before * 1e6:10.1f}us" if before else ""
+        change = f"{(seconds / before - 1) * 100:+7.1f}%" if before else ""
+        print(f"{case:<34} {seconds * 1e6:10.1f}us {was:>12} {change:>8}")
+    if args.output:
+        _save(args.output, results)
+    if args.save_baseline:
+        _save(args.baseline, results)
+        print(f"Saved the baseline to {args.baseline}")
+        return
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+    for case, seconds, before, ratio in regressions:
+        print(f"REGRESSION {case}: {seconds * 1e6:.1f}us vs {before * 1e6:.1f}us ({ratio:.2f}x)")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
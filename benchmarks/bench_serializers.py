@@ -0,0 +1,51 @@
+"""
+Benchmark: compiled serializers vs flask-restx marshalling
+
+Builds a page of transient Orders with the test factories (no database
+needed) and times serializing the whole page both ways.
+
+Usage:
+    python -m benchmarks.bench_serializers [--orders 1000] [--items 3] [--repeat 5]
+"""
+import argparse
+import timeit
+from flask_restx import marshal
+from service.api.orders import order_model
+from service.api.serializers import serializer_for
+from tests.factories import OrderFactory, OrderItemFactory
+
+
+def make_page(orders: int, items: int) -> list:
+    """Returns a list of Orders that each have some OrderItems"""
+    page = OrderFactory.build_batch(orders)
+    for order in page:
+        OrderItemFactory.build_batch(items, order=order)
+    return page
+
+
+def run(orders: int = 1000, items: int = 3, repeat: int = 5) -> dict:
+    """Times both serializers and returns the best time of each in seconds"""
+    page = make_page(orders, items)
+    serializer = serializer_for(order_model)
+    assert [serializer(order) for order in page] == marshal(page, order_model)
+    marshalled = min(timeit.repeat(lambda: marshal(page, order_model), number=1, repeat=repeat))
+    compiled = min(timeit.repeat(lambda: [serializer(order) for order in page], number=1, repeat=repeat))
+    return {"marshal": marshalled, "compiled": compiled, "speedup": marshalled / compiled}
+
+
+def main():
+    """Runs the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    result = run(args.orders, args.items, args.repeat)
+    print(f"{args.orders} orders x {args.items} items")
+    print(f"  flask-restx marshal : {result['marshal'] * 1000:8.2f} ms")
+    print(f"  compiled serializer : {result['compiled'] * 1000:8.2f} ms")
+    print(f"  speedup             : {result['speedup']:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,9 +19,33 @@ This module creates and configures the Flask app and sets up the logging
 and SQL database
 """
 import sys
+from time import perf_counter
 from flask import Flask
+from flask.cli import AppGroup
 from service import config
-from service.common import log_handlers
+from service.common import log_handlers, json_provider, compression, db_pool
+
+
+class LazyAppGroup(AppGroup):
+    """The app's CLI commands, imported the first time the flask CLI looks for one"""
+
+    loaded = False
+
+    def _load(self):
+        if not self.loaded:
+            from service.common import cli_commands  # pylint: disable=import-outside-toplevel
+
+            for command in cli_commands.COMMANDS:
+                self.add_command(command)
+            self.loaded = True
+
+    def get_command(self, ctx, cmd_name):
+        self._load()
+        return super().get_command(ctx, cmd_name)
+
+    def list_commands(self, ctx):
+        self._load()
+        return super().list_commands(ctx)
 
 
 ############################################################
@@ -29,37 +53,41 @@ from service.common import log_handlers
 ############################################################
 def create_app():
     """Initialize the core application."""
+    started = perf_counter()
     # Create Flask application
     app = Flask(__name__)
     app.config.from_object(config)
+    app.cli = LazyAppGroup(app.name)
 
     # Preserve key order in JSON responses
     app.config["JSON_SORT_KEYS"] = False
-    app.json.sort_keys = False
+    json_provider.init_app(app)
 
     # Initialize Plugins
     # pylint: disable=import-outside-toplevel
     from service.models import db
     from service.api import api_bp
+    from service.common import request_metrics
 
+    # Size and instrument the connection pool from the DB_POOL_* settings
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", db_pool.engine_options(app.config))
     db.init_app(app)
     app.register_blueprint(api_bp)
+    # before compression, whose after_request must run first so the sizes are those sent
+    request_metrics.init_app(app)
+    compression.init_app(app)
 
     with app.app_context():
         # Dependencies require we import the routes AFTER the Flask app is created
         # pylint: disable=wrong-import-position, wrong-import-order, unused-import
         from service import routes, models  # noqa: F401 E402
-        from service.common import cli_commands  # noqa: F401, E402
-        from service.common.error_handlers import init_app as init_error_handlers
 
-        init_error_handlers(app)
+        init_extensions(app)
 
-        try:
-            db.create_all()
-        except Exception as error:  # pylint: disable=broad-except
-            app.logger.critical("%s: Cannot continue", error)
-            # gunicorn requires exit code 4 to stop spawning workers when they die
-            sys.exit(4)
+        schema_started = perf_counter()
+        init_schema(app)
+        boot = app.extensions["boot"] = {"schema_mode": app.config.get("SCHEMA_MODE", "create")}
+        boot["schema_seconds"] = perf_counter() - schema_started
 
         # Set up logging for production
         log_handlers.init_logging(app, "gunicorn.error")
@@ -68,6 +96,55 @@ def create_app():
         app.logger.info("  S E R V I C E   R U N N I N G  ".center(70, "*"))
         app.logger.info(70 * "*")
 
-        app.logger.info("Service initialized!")
+        boot["seconds"] = perf_counter() - started
+        app.logger.info("Service initialized in %.3fs (schema %s: %.3fs)",
+                        boot["seconds"], boot["schema_mode"], boot["schema_seconds"])
 
         return app
+
+
+def init_extensions(app):
+    """Installs the error handlers, caches and database hooks"""
+    # pylint: disable=import-outside-toplevel
+    from service.common import error_handlers, shared_cache, replicas, db_session, deadlines, db_retry
+    from service.common import prefork, statement_cache, sql_accounting, tracing, profiling
+
+    error_handlers.init_app(app)
+    shared_cache.init_app(app)
+    db_session.init_app(app)
+    deadlines.init_app(app)
+    db_retry.init_app(app)
+    replicas.init_app(app)
+    prefork.init_app(app)
+    statement_cache.init_app(app)
+    sql_accounting.init_app(app)
+    tracing.init_app(app)
+    profiling.init_app(app)
+
+
+def init_schema(app):
+    """Creates, verifies or leaves alone the database schema, as SCHEMA_MODE says"""
+    # pylint: disable=import-outside-toplevel
+    from service.models import schema
+    from service.common import db_retry
+
+    mode = app.config.get("SCHEMA_MODE", "create")
+    steps = {"create": schema.upgrade, "verify": schema.verify}
+    if mode == "off":
+        return
+    if mode not in steps:
+        raise RuntimeError(f"SCHEMA_MODE must be one of create, verify or off; not {mode!r}")
+    try:
+        # the database may still be starting up along with us; DB_STARTUP_TRIES
+        # decides how long to wait for it, not the circuit breaker
+        with db_retry.breakers_bypassed():
+            db_retry.call(
+                steps[mode],
+                tries=app.config["DB_STARTUP_TRIES"],
+                delay=app.config["DB_STARTUP_DELAY"],
+                max_delay=8 * app.config["DB_STARTUP_DELAY"],
+            )
+    except Exception as error:  # pylint: disable=broad-except
+        app.logger.critical("%s: Cannot continue", error)
+        # gunicorn requires exit code 4 to stop spawning workers when they die
+        sys.exit(4)
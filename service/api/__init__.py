@@ -3,10 +3,13 @@ Flask-RESTX API initialization
 """
 from flask_restx import Api
 from flask import Blueprint
+from service.common import tracing
 from . import orders, orderitems
+from .representations import JSON, output_json
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+# flask-restx builds the Swagger spec on the first request for it, not at startup
 api = Api(
     api_bp,
     version='1.0',
@@ -14,9 +17,12 @@ api = Api(
     description='A simple Orders service API with Swagger documentation',
     doc='/apidocs/',
     default='Orders',
-    default_label='Orders operations'
+    default_label='Orders operations',
+    decorators=[tracing.traced("view")],
 )
 
+api.representation(JSON)(output_json)
+
 
 api.add_namespace(orders.ns)
 api.add_namespace(orderitems.ns)
@@ -3,9 +3,10 @@ OrderItems Namespace
 """
 from flask_restx import Namespace, Resource, fields
 from flask import request
-from service.models import Order, OrderItem
+from service.models import Order, OrderItem, unit_of_work
 from service.common import status
 from .orders import order_item_model
+from .serializers import serialize_with
 
 # Create namespace
 ns = Namespace('orderitems', description='OrderItem operations', path='/orders/<int:order_id>/orderitems')
@@ -25,7 +26,7 @@ class OrderItemCollection(Resource):
 
     @ns.doc('list_orderitems')
     @ns.response(404, 'Order not found')
-    @ns.marshal_list_with(order_item_model)
+    @serialize_with(ns, order_item_model, as_list=True)
     def get(self, order_id):
         """List all order items for an order"""
         order = Order.find(order_id)
@@ -38,7 +39,8 @@ class OrderItemCollection(Resource):
     @ns.response(201, 'OrderItem created')
     @ns.response(400, 'Invalid input')
     @ns.response(404, 'Order not found')
-    @ns.marshal_with(order_item_model, code=201)
+    @serialize_with(ns, order_item_model, code=201)
+    @unit_of_work()
     def post(self, order_id):
         """Add an order item to an order"""
         order = Order.find(order_id)
@@ -63,7 +65,7 @@ class OrderItemResource(Resource):
 
     @ns.doc('get_orderitem')
     @ns.response(404, 'OrderItem not found')
-    @ns.marshal_with(order_item_model)
+    @serialize_with(ns, order_item_model)
     def get(self, order_id, orderitem_id):
         """Get a specific order item"""
         order = Order.find(order_id)
@@ -83,7 +85,8 @@ class OrderItemResource(Resource):
     @ns.expect(order_item_model)
     @ns.response(400, 'Invalid input')
     @ns.response(404, 'OrderItem not found')
-    @ns.marshal_with(order_item_model)
+    @serialize_with(ns, order_item_model)
+    @unit_of_work()
     def put(self, order_id, orderitem_id):
         """Update an order item"""
         orderitem = OrderItem.find(orderitem_id)
@@ -100,6 +103,7 @@ class OrderItemResource(Resource):
     @ns.doc('delete_orderitem')
     @ns.response(204, 'OrderItem deleted')
     @ns.response(404, 'OrderItem not found')
+    @unit_of_work()
     def delete(self, order_id, orderitem_id):
         """Delete an order item"""
         order = Order.find(order_id)
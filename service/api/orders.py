@@ -1,12 +1,13 @@
 """
 Orders Namespace
 """
-from datetime import datetime, timedelta
 from flask_restx import Namespace, Resource, fields, reqparse
 from flask import request
-from service.models import Order
-from service.common import status
+from service.models import Order, DataValidationError, unit_of_work
+from service.common import status, replicas, shared_cache, tracing
 from service.common.order_status import Status
+from .serializers import serialize_with, serializer_for
+from .representations import NEGOTIATED, renders_objects
 
 ns = Namespace('orders', description='Order operations')
 
@@ -47,51 +48,32 @@ order_parser.add_argument('created_at', type=str, help='Filter by creation date
 class OrderCollection(Resource):
     """Handles list and creation of Orders"""
 
+    representations = NEGOTIATED
+
     @ns.doc('list_orders')
+    @ns.produces(list(NEGOTIATED))
     @ns.expect(order_parser)
-    @ns.marshal_list_with(order_model)
+    @serialize_with(ns, order_model, as_list=True)
     def get(self):
         """List all orders with optional filtering"""
-        args = order_parser.parse_args()
-        status_arg = args.get('status')
-        customer_id = args.get('customer_id')
-        created_at = args.get('created_at')
-
-        query = Order.query
-
-        if status_arg:
-            try:
-                status_enum = Status[status_arg.upper()]
-                query = query.filter(Order.status == status_enum)
-            except KeyError:
-                ns.abort(status.HTTP_400_BAD_REQUEST,
-                         f"Unknown status '{status_arg}'. Valid statuses: {[s.name for s in Status]}")
-
-        if customer_id:
-            query = query.filter(Order.customer_id == customer_id)
-
-        if created_at:
-            try:
-                dt = datetime.fromisoformat(created_at)
-            except ValueError:
-                ns.abort(status.HTTP_400_BAD_REQUEST,
-                         "Invalid date format for created_at. Use ISO 8601.")
-
-            if len(created_at) <= 10:
-                start = datetime(dt.year, dt.month, dt.day)
-                end = start + timedelta(days=1)
-                query = query.filter(Order.created_at >= start, Order.created_at < end)
-            else:
-                query = query.filter(Order.created_at == dt)
-
-        orders = query.all()
+        with tracing.span("reqparse"):
+            args = order_parser.parse_args()
+        try:
+            orders = Order.find_filtered(
+                status=args.get('status'),
+                customer_id=args.get('customer_id'),
+                created_at=args.get('created_at'),
+            )
+        except DataValidationError as error:
+            ns.abort(status.HTTP_400_BAD_REQUEST, str(error))
         return orders, status.HTTP_200_OK
 
     @ns.doc('create_order')
     @ns.expect(create_order_model)
     @ns.response(status.HTTP_201_CREATED, 'Order created')
     @ns.response(status.HTTP_400_BAD_REQUEST, 'Invalid input')
-    @ns.marshal_with(order_model, code=status.HTTP_201_CREATED)
+    @serialize_with(ns, order_model, code=status.HTTP_201_CREATED)
+    @unit_of_work()
     def post(self):
         """Create a new order"""
         data = request.get_json()
@@ -107,19 +89,36 @@ class OrderCollection(Resource):
 class OrderResource(Resource):
     """Handles single Order operations"""
 
+    representations = NEGOTIATED
+
     @ns.doc('get_order')
-    @ns.marshal_with(order_model)
+    @ns.produces(list(NEGOTIATED))
+    @ns.response(status.HTTP_200_OK, 'Success', order_model)
     def get(self, order_id):
         """Retrieve a single order"""
+        # the cache holds the JSON document, other formats serialize the Order;
+        # a client that has just written may be newer than the cached copy
+        as_json = not renders_objects(self)
+        key = shared_cache.order_key(order_id)
+        data = shared_cache.fetch(key) if as_json and not replicas.is_sticky() else None
+        if data is not None:
+            return data, status.HTTP_200_OK
+
         order = Order.find(order_id)
         if not order:
             ns.abort(status.HTTP_404_NOT_FOUND, f"Order with id '{order_id}' not found")
-        return order, status.HTTP_200_OK
+        if not as_json:
+            return order, status.HTTP_200_OK
+        data = serializer_for(order_model)(order)
+        if not replicas.reads_replica():  # a lagging replica's copy must not be shared
+            shared_cache.store(key, data)
+        return data, status.HTTP_200_OK
 
     @ns.doc('update_order')
     @ns.expect(order_model)
     @ns.response(400, 'Invalid input')
-    @ns.marshal_with(order_model)
+    @serialize_with(ns, order_model)
+    @unit_of_work()
     def put(self, order_id):
         """Update an order"""
         order = Order.find(order_id)
@@ -134,6 +133,7 @@ class OrderResource(Resource):
 
     @ns.doc('delete_order')
     @ns.response(204, 'Order deleted')
+    @unit_of_work()
     def delete(self, order_id):
         """Delete an order"""
         order = Order.find(order_id)
@@ -151,7 +151,8 @@ class OrderCancel(Resource):
     @ns.response(200, 'Order cancelled')
     @ns.response(404, 'Order not found')
     @ns.response(409, 'Order cannot be cancelled')
-    @ns.marshal_with(order_model)
+    @serialize_with(ns, order_model)
+    @unit_of_work()
     def put(self, order_id):
         """Cancel an order"""
         order = Order.find(order_id)
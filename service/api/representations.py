@@ -0,0 +1,112 @@
+"""
+Response Representations
+
+JSON is the default representation of every API response. Resources that
+set ``representations = NEGOTIATED`` can also be read as MessagePack or
+CSV, chosen from the ``Accept`` header. Those two are built from the
+models' own ``serialize()`` instead of the JSON response model, so the
+handlers return model objects and the compiled JSON serializer steps
+aside (see ``renders_objects``).
+"""
+import io
+import csv
+import importlib.util
+from collections import OrderedDict
+from decimal import Decimal
+from datetime import date, datetime
+from flask import current_app, request
+from service.common import tracing
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CSV = "text/csv"
+
+CSV_COLUMNS = (
+    "order_id", "customer_id", "status", "total_amount", "created_at", "updated_at",
+    "orderitem_id", "product_id", "price", "quantity", "line_amount",
+)
+
+
+def output_json(data, code, headers=None):
+    """Encodes API responses with the app's JSON provider instead of stdlib json"""
+    with tracing.span("json encode"):
+        response = current_app.json.response(data)
+    response.status_code = code
+    response.headers.extend(headers or {})
+    return response
+
+
+def _as_list(data) -> list:
+    return data if isinstance(data, list) else [data]
+
+
+def _serialize(obj, native: bool):
+    return obj.serialize(native) if hasattr(obj, "serialize") else obj
+
+
+######################################################################
+#  M E S S A G E P A C K
+######################################################################
+def _msgpack_default(value):
+    """Encodes the types MessagePack does not know about"""
+    if isinstance(value, Decimal):
+        # prices are NUMERIC(10, 2), well inside what a double round-trips
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not MessagePack serializable")
+
+
+def output_msgpack(data, code, headers=None):
+    """Encodes model objects as MessagePack with native numbers"""
+    import msgpack  # pylint: disable=import-outside-toplevel
+
+    if isinstance(data, list):
+        payload = [_serialize(obj, native=True) for obj in data]
+    else:
+        payload = _serialize(data, native=True)
+    body = msgpack.packb(payload, default=_msgpack_default, use_bin_type=True)
+    response = current_app.response_class(body, status=code, mimetype=MSGPACK)
+    response.headers.extend(headers or {})
+    return response
+
+
+######################################################################
+#  C S V
+######################################################################
+def _csv_rows(order: dict):
+    """Flattens an Order into one row per OrderItem (or one row if it has none)"""
+    head = [order["id"], order["customer_id"], order["status"], order["total_amount"],
+            order["created_at"], order["updated_at"]]
+    items = order.get("orderitem") or [None]
+    for item in items:
+        if item is None:
+            yield head + [""] * 5
+        else:
+            yield head + [item["id"], item["product_id"], item["price"], item["quantity"], item["line_amount"]]
+
+
+def output_csv(data, code, headers=None):
+    """Encodes Orders as CSV with one line per OrderItem"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for obj in _as_list(data):
+        writer.writerows(_csv_rows(_serialize(obj, native=False)))
+    response = current_app.response_class(buffer.getvalue(), status=code, mimetype=CSV)
+    response.headers.extend(headers or {})
+    return response
+
+
+# JSON comes first so that "Accept: */*" keeps getting JSON
+NEGOTIATED = OrderedDict([(JSON, output_json), (CSV, output_csv)])
+if importlib.util.find_spec("msgpack") is not None:
+    NEGOTIATED[MSGPACK] = output_msgpack
+
+
+def renders_objects(resource) -> bool:
+    """Tells whether the negotiated representation serializes model objects itself"""
+    representations = getattr(resource, "representations", None)
+    if not representations:
+        return False
+    return request.accept_mimetypes.best_match(representations, default=JSON) != JSON
@@ -0,0 +1,255 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+ASGI Application
+
+Serves the Order reads, ``GET /api/orders`` and ``GET /api/orders/<id>``,
+on an event loop with SQLAlchemy's async engine on psycopg's async
+driver. A process then serves as many reads at once as its pool has
+connections (``ASYNC_DB_POOL_SIZE``) rather than one per worker thread.
+These reads share the following with the Flask app:
+
+* the queries (``Order.filtered``);
+* the JSON documents (the compiled serializer of the flask-restx model);
+* the ``READ_ONLY_MODE`` transactions;
+* the request deadlines and their timeout counts;
+* the response compression (``COMPRESSION_*``);
+* the request metrics, under the same namespace and route labels.
+
+Some of what the Flask app does to a read is left out:
+
+* They always read from the primary. ``DATABASE_REPLICA_URIS`` is not
+  used, so read-your-writes holds without the sticky window.
+* They neither read nor fill the shared Order cache.
+* Their statements are not counted by the SQL accounting, so they do
+  not show in the per-request SQL metrics, the slow request log or the
+  N+1 detection.
+* They are neither traced nor profiled.
+
+Every other request is handed to the Flask app in a thread, so a single
+ASGI server can serve the whole API. That includes the reads whose
+Accept header negotiates to another representation than JSON, by the
+same rules as the Flask app. Run it with uvicorn::
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8080
+"""
+import re
+import sys
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from time import perf_counter
+from urllib.parse import parse_qs
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+from werkzeug.datastructures import Headers, MIMEAccept
+from werkzeug.http import parse_accept_header
+from service.api.representations import JSON, NEGOTIATED
+from service.common import status, request_metrics
+from service.common.compression import available_encodings, negotiate
+from service.common.db_pool import engine_options
+from service.common.db_session import READ_ONLY_OPTIONS, read_only_mode
+from service.common.deadlines import budget_for, count_timeout
+from service.models import Order, DataValidationError
+
+logger = logging.getLogger("flask.app")
+
+COLLECTION_PATH = "/api/orders"
+ORDER_PATH = re.compile(r"^/api/orders/(\d+)$")
+COLLECTION_ENDPOINT = "api.orders_order_collection"
+ORDER_ENDPOINT = "api.orders_order_resource"
+DEADLINE_MESSAGE = "The database did not answer before the request deadline"
+
+
+def async_engine_options(config) -> dict:
+    """Builds the async engine's options from the DB_POOL_* settings and ASYNC_DB_POOL_SIZE"""
+    options = engine_options(config)
+    del options["poolclass"]  # the async engine needs its own queue pool
+    options["pool_size"] = config["ASYNC_DB_POOL_SIZE"]
+    return options
+
+
+class AsgiApp:  # pylint: disable=too-few-public-methods
+    """Serves Order reads with the async engine and everything else with the Flask app"""
+
+    def __init__(self, flask_app, engine=None):
+        # pylint: disable=import-outside-toplevel
+        from service.api.orders import order_model
+        from service.api.serializers import serializer_for
+
+        config = flask_app.config
+        self.flask_app = flask_app
+        self.engine = engine or create_async_engine(config["SQLALCHEMY_DATABASE_URI"], **async_engine_options(config))
+        mode = read_only_mode(config)
+        reader = self.engine.execution_options(**READ_ONLY_OPTIONS[mode]) if mode != "off" else self.engine
+        self.sessions = async_sessionmaker(reader, expire_on_commit=False)
+        self.serialize = serializer_for(order_model)
+        self.executor = ThreadPoolExecutor(config.get("ASGI_WSGI_THREADS", 4), thread_name_prefix="wsgi")
+        self.encodings = available_encodings(config) if config.get("COMPRESSION_ENABLED", True) else None
+        self.min_size = config.get("COMPRESSION_MIN_SIZE", 1024)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        headers = Headers([(key.decode("latin-1"), value.decode("latin-1")) for key, value in scope["headers"]])
+        if scope["method"] == "GET" and self._wants_json(headers):
+            if scope["path"] == COLLECTION_PATH:
+                await self._read(send, COLLECTION_ENDPOINT, headers, self._list_orders(scope))
+                return
+            match = ORDER_PATH.match(scope["path"])
+            if match:
+                await self._read(send, ORDER_ENDPOINT, headers, self._get_order(int(match.group(1))))
+                return
+        await self._call_flask(scope, receive, send)
+
+    @staticmethod
+    def _wants_json(headers) -> bool:
+        """Tells whether the Flask app would answer with JSON"""
+        accept = parse_accept_header(headers.get("Accept"), MIMEAccept)
+        return accept.best_match(NEGOTIATED, default=JSON) == JSON
+
+    ######################################################################
+    #  O R D E R   R E A D S
+    ######################################################################
+    async def _list_orders(self, scope):
+        query = {key: values[0] for key, values in parse_qs(scope["query_string"].decode("latin-1")).items()}
+        try:
+            statement = Order.filtered(
+                status=query.get("status"), customer_id=query.get("customer_id"), created_at=query.get("created_at")
+            )
+        except DataValidationError as error:
+            return status.HTTP_400_BAD_REQUEST, {"message": str(error)}
+        async with self.sessions() as session:
+            orders = (await session.scalars(statement.options(selectinload(Order.orderitem)))).all()
+            return status.HTTP_200_OK, [self.serialize(order) for order in orders]
+
+    async def _get_order(self, order_id: int):
+        async with self.sessions() as session:
+            order = await session.get(Order, order_id, options=[selectinload(Order.orderitem)])
+            if order is None:
+                return status.HTTP_404_NOT_FOUND, {"message": f"Order with id '{order_id}' not found"}
+            return status.HTTP_200_OK, self.serialize(order)
+
+    async def _read(self, send, endpoint, headers, handler):
+        """Runs a read within the request's deadline and sends its JSON document"""
+        started = perf_counter()
+        metrics = self.flask_app.config.get("METRICS_ENABLED", True)
+        if metrics:
+            request_metrics.IN_FLIGHT.labels().inc()
+        try:
+            try:
+                async with asyncio.timeout(budget_for(self.flask_app, endpoint, headers)):
+                    code, data = await handler
+            except TimeoutError:
+                count_timeout(endpoint)
+                code, data = status.HTTP_504_GATEWAY_TIMEOUT, {"message": DEADLINE_MESSAGE}
+            body, response_headers = self._encode(data, headers)
+            await send({"type": "http.response.start", "status": code, "headers": response_headers})
+            await send({"type": "http.response.body", "body": body})
+        finally:
+            if metrics:
+                request_metrics.IN_FLIGHT.labels().dec()
+        if metrics:
+            labels = request_metrics.endpoint_labels(self.flask_app, endpoint)
+            request_metrics.record(self.flask_app, labels, "GET", code, perf_counter() - started, len(body))
+
+    def _encode(self, data, headers) -> tuple:
+        """Returns the body and headers of a JSON document, compressed as the Flask app would"""
+        body = self.flask_app.json.dumps(data).encode("utf-8")
+        response_headers = [(b"content-type", b"application/json")]
+        if self.encodings is not None:
+            response_headers.append((b"vary", b"Accept-Encoding"))
+            encoding = negotiate(parse_accept_header(headers.get("Accept-Encoding")), self.encodings)
+            if encoding is not None and len(body) >= self.min_size:
+                compressor = self.encodings[encoding]()
+                body = compressor.compress(body) + compressor.flush()
+                response_headers.append((b"content-encoding", encoding.encode()))
+        response_headers.append((b"content-length", str(len(body)).encode()))
+        return body, response_headers
+
+    ######################################################################
+    #  E V E R Y T H I N G   E L S E
+    ######################################################################
+    async def _call_flask(self, scope, receive, send):
+        """Runs the Flask app in a thread with the request translated to WSGI"""
+        body = bytearray()
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        environ = _wsgi_environ(scope, bytes(body))
+        started = {}
+
+        def start_response(status_line, response_headers, exc_info=None):  # pylint: disable=unused-argument
+            started["status"] = int(status_line.split(" ", 1)[0])
+            started["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                  for name, value in response_headers]
+
+        def run():
+            result = self.flask_app(environ, start_response)
+            try:
+                return b"".join(result)
+            finally:
+                getattr(result, "close", lambda: None)()
+
+        content = await asyncio.get_running_loop().run_in_executor(self.executor, run)
+        await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+        await send({"type": "http.response.body", "body": content})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def _wsgi_environ(scope, body: bytes) -> dict:
+    """Translates an ASGI HTTP scope into a WSGI environ"""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for key, value in scope["headers"]:
+        name = key.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        environ[name] = f"{environ[name]},{value}" if name in environ and name.startswith("HTTP_") else value
+    return environ
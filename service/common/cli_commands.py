@@ -15,9 +15,13 @@
 ######################################################################
 """
 Flask CLI Command Extensions
+
+The app imports this module only when the flask CLI asks for its
+commands, so workers never pay for it.
 """
-from flask import current_app as app  # Import Flask application
-from service.models import db
+import click
+from flask.cli import with_appcontext
+from service.models import db, schema
 
 
 ######################################################################
@@ -25,7 +29,8 @@ from service.models import db
 # Usage:
 #   flask db-create
 ######################################################################
-@app.cli.command("db-create")
+@click.command("db-create")
+@with_appcontext
 def db_create():
     """
     Recreates a local database. You probably should not use this on
@@ -34,3 +39,22 @@ def db_create():
     db.drop_all()
     db.create_all()
     db.session.commit()
+
+
+######################################################################
+# Command to create or upgrade the schema
+# Usage:
+#   flask db-upgrade
+######################################################################
+@click.command("db-upgrade")
+@with_appcontext
+def db_upgrade():
+    """
+    Creates the missing tables and records the schema version. Run it
+    before starting workers with SCHEMA_MODE=verify.
+    """
+    version = schema.upgrade()
+    click.echo(f"Database schema is at version {version}")
+
+
+COMMANDS = (db_create, db_upgrade)
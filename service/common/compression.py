@@ -0,0 +1,189 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Response Compression
+
+Compresses response bodies with the best encoding the client accepts.
+gzip is always available; zstd and brotli are used when the
+``zstandard`` and ``brotli`` packages are installed. Bodies smaller than
+``COMPRESSION_MIN_SIZE`` are sent as they are. Streamed responses are
+compressed chunk by chunk once enough of the stream has been seen to
+know it is over the threshold.
+"""
+import zlib
+import importlib
+from itertools import chain
+from flask import request
+
+COMPRESSIBLE_MIMETYPES = (
+    "application/json",
+    "application/javascript",
+    "text/csv",
+    "text/css",
+    "text/html",
+    "text/plain",
+)
+
+
+######################################################################
+#  E N C O D I N G S
+######################################################################
+class _GzipCompressor:
+    """Adapts zlib to the compress()/flush() interface"""
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """Compresses a chunk"""
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        """Finishes the stream"""
+        return self._compressor.flush()
+
+
+class _ZstdCompressor:
+    """Adapts zstandard to the compress()/flush() interface"""
+
+    def __init__(self, module, level: int):
+        self._compressor = module.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        """Compresses a chunk"""
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        """Finishes the stream"""
+        return self._compressor.flush()
+
+
+class _BrotliCompressor:
+    """Adapts brotli to the compress()/flush() interface"""
+
+    def __init__(self, module, level: int):
+        self._compressor = module.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        """Compresses a chunk"""
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        """Finishes the stream"""
+        return self._compressor.finish()
+
+
+def _optional(module_name: str):
+    """Imports an optional compression library, returning None if it is missing"""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        return None
+
+
+def available_encodings(config) -> dict:
+    """Returns {encoding: compressor factory} for the configured encodings we can produce"""
+    factories = {}
+    for name in config.get("COMPRESSION_ENCODINGS", ("zstd", "br", "gzip")):
+        if name == "gzip":
+            level = config.get("COMPRESSION_GZIP_LEVEL", 6)
+            factories[name] = lambda level=level: _GzipCompressor(level)
+        elif name == "zstd" and (module := _optional("zstandard")):
+            level = config.get("COMPRESSION_ZSTD_LEVEL", 3)
+            factories[name] = lambda module=module, level=level: _ZstdCompressor(module, level)
+        elif name == "br" and (module := _optional("brotli")):
+            level = config.get("COMPRESSION_BROTLI_LEVEL", 4)
+            factories[name] = lambda module=module, level=level: _BrotliCompressor(module, level)
+    return factories
+
+
+def negotiate(accept_encodings, encodings) -> str:
+    """Returns the encoding the client prefers most, ties going to our order, or None"""
+    best, best_quality = None, 0
+    for name in encodings:
+        quality = accept_encodings.quality(name)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+######################################################################
+#  R E S P O N S E   H A N D L I N G
+######################################################################
+def _compress_stream(compressor, chunks):
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _peek(iterable, size: int):
+    """Reads chunks until at least size bytes are seen; returns (chunks, rest or None if exhausted)"""
+    iterator = iter(iterable)
+    head, seen = [], 0
+    for chunk in iterator:
+        chunk = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+        head.append(chunk)
+        seen += len(chunk)
+        if seen >= size:
+            return head, iterator
+    return head, None
+
+
+def compress_response(response, encodings: dict, min_size: int):
+    """Compresses response in place if the client and the body allow it"""
+    if (
+        response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate(request.accept_encodings, encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        head, rest = _peek(response.response, min_size)
+        if rest is None:
+            response.set_data(b"".join(head))
+            return response
+        response.response = _compress_stream(encodings[encoding](), chain(head, rest))
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        compressor = encodings[encoding]()
+        response.set_data(compressor.compress(data) + compressor.flush())
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_app(app):
+    """Compresses responses according to the COMPRESSION_* settings"""
+    if not app.config.get("COMPRESSION_ENABLED", True):
+        return
+    encodings = available_encodings(app.config)
+
+    @app.after_request
+    def compress(response):  # pylint: disable=unused-variable
+        """Compresses the body for clients that accept it"""
+        return compress_response(response, encodings, app.config.get("COMPRESSION_MIN_SIZE", 1024))
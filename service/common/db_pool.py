@@ -0,0 +1,115 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Database Connection Pool
+
+A ``QueuePool`` that times every checkout. Each worker process has its
+own pool, so a replica holds at most ``workers x (DB_POOL_SIZE +
+DB_MAX_OVERFLOW)`` connections to PostgreSQL.
+"""
+import threading
+from time import perf_counter
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+from service.common.metrics import Histogram
+from service.common.statement_cache import connect_args
+
+
+class PoolStats:
+    """Checkout counters and latencies of one pool"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self.checkout_latency = Histogram()
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, waited: bool, timed_out: bool = False):
+        """Counts a checkout that took seconds"""
+        with self._lock:  # worker threads check out concurrently
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.wait_seconds += seconds
+            if timed_out:
+                self.timeouts += 1
+        self.checkout_latency.observe(seconds)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """A QueuePool that records how long each checkout takes"""
+
+    def __init__(self, *args, stats: PoolStats = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats or PoolStats()
+
+    def _do_get(self):
+        # no idle connection means we either open one or queue for one
+        waited = self.checkedin() == 0
+        start = perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.stats.record(perf_counter() - start, waited, timed_out)
+
+    def recreate(self):
+        # engine.dispose() swaps in a new pool; keep counting where we left off
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def engine_options(config) -> dict:
+    """Builds SQLALCHEMY_ENGINE_OPTIONS from the DB_POOL_* and statement cache settings"""
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+        "pool_use_lifo": config["DB_POOL_USE_LIFO"],
+        "query_cache_size": config["DB_QUERY_CACHE_SIZE"],
+        "connect_args": connect_args(config),
+    }
+
+
+def pool_status(engine) -> dict:
+    """Returns a snapshot of the engine's pool"""
+    pool = engine.pool
+    status = {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        status.update(
+            checkouts=stats.checkouts,
+            waits=stats.waits,
+            wait_seconds=stats.wait_seconds,
+            timeouts=stats.timeouts,
+            checkout_latency=stats.checkout_latency.snapshot(),
+        )
+    return status
@@ -0,0 +1,260 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Database Retries
+
+Transient database errors come in two kinds: serialization failures
+(a serialization conflict or a deadlock, where PostgreSQL rolled the
+transaction back and it can simply be run again) and connection errors
+(the server went away or could not be reached). ``call()`` retries an
+operation after either, with exponential backoff and jitter, and once
+the attempts run out reports the first kind as 409 Conflict and the
+second as 503 Service Unavailable. Only operations that are safe to run
+again should be retried: reads, and writes whose commit has not been
+sent.
+
+Every engine also has a circuit breaker. After ``DB_BREAKER_THRESHOLD``
+connection errors in a row it opens, and for ``DB_BREAKER_RESET_SECONDS``
+the engine fails fast with 503 instead of connecting and waiting. Once
+that time has passed it is half-open: one thread at a time tries the
+database, and the others keep failing fast until the trial succeeds,
+which closes the breaker, or fails, which opens it again. Waiting for
+the database at startup is left out of it (``breakers_bypassed()``), so
+that ``DB_STARTUP_TRIES`` alone decides how long to wait.
+"""
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from weakref import WeakKeyDictionary
+from flask import current_app
+from retry.api import retry_call
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from werkzeug.exceptions import Conflict, ServiceUnavailable
+
+logger = logging.getLogger("flask.app")
+
+SERIALIZATION_FAILURES = frozenset(("40001", "40P01"))  # serialization_failure, deadlock_detected
+# admin_shutdown, crash_shutdown, cannot_connect_now
+SERVER_GONE = frozenset(("57P01", "57P02", "57P03"))
+
+SERIALIZATION = "serialization"
+CONNECTION = "connection"
+
+
+class TransientDatabaseError(Exception):
+    """A database error that may go away if the operation is run again"""
+
+
+class ConcurrentUpdateError(Conflict):
+    """The operation kept conflicting with concurrent transactions"""
+
+    description = "The request conflicted with concurrent updates, please try again"
+
+
+class DatabaseUnavailable(ServiceUnavailable):
+    """The database cannot be reached"""
+
+    description = "The database is unavailable, please try again later"
+
+
+def classify(error) -> str:
+    """Returns SERIALIZATION or CONNECTION for a transient database error, else None"""
+    if not isinstance(error, DBAPIError):
+        return None
+    if error.connection_invalidated:
+        return CONNECTION
+    sqlstate = getattr(error.orig, "sqlstate", None)
+    if sqlstate in SERIALIZATION_FAILURES:
+        return SERIALIZATION
+    if sqlstate in SERVER_GONE or (sqlstate or "").startswith("08"):
+        return CONNECTION
+    if sqlstate is None and type(error.orig).__name__ == "OperationalError":
+        return CONNECTION  # refused, reset or timed out before PostgreSQL said anything
+    return None
+
+
+def translate(error) -> Exception:
+    """Returns the HTTP error a transient database error is reported as"""
+    if classify(error) == SERIALIZATION:
+        return ConcurrentUpdateError()
+    return DatabaseUnavailable(retry_after=int(current_app.config.get("DB_BREAKER_RESET_SECONDS", 30)))
+
+
+######################################################################
+#  C I R C U I T   B R E A K E R
+######################################################################
+class CircuitBreaker:
+    """Stops using a database that keeps failing to connect"""
+
+    def __init__(self, threshold: int = 5, reset_seconds: float = 30.0):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial = None  # (thread id, monotonic time) of the half-open trial
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """closed, open, or half-open once the reset time has passed"""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half-open"
+
+    def check(self):
+        """Raises DatabaseUnavailable while the breaker is open, or half-open and another thread has the trial"""
+        if self.opened_at is None:
+            return
+        with self._lock:
+            state = self.state
+            if state == "half-open":
+                thread, now = threading.get_ident(), time.monotonic()
+                # a trial that ended in neither a success nor a connection error
+                # gives way to another after reset_seconds
+                if self.trial is None or self.trial[0] == thread or now - self.trial[1] >= self.reset_seconds:
+                    self.trial = (thread, now)
+                    return
+            elif state == "closed":
+                return
+        raise DatabaseUnavailable(retry_after=int(self.reset_seconds))
+
+    def record_failure(self):
+        """Counts a connection error, opening the breaker at the threshold"""
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None or self.state == "half-open":
+                    logger.error("Database circuit breaker opened after %d connection errors", self.failures)
+                self.opened_at = time.monotonic()
+                self.trial = None
+
+    def record_success(self):
+        """Closes the breaker"""
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("Database circuit breaker closed")
+            self.failures = 0
+            self.opened_at = None
+            self.trial = None
+
+
+_bypassed = ContextVar("breaker_bypassed", default=False)
+
+
+@contextmanager
+def breakers_bypassed():
+    """Lets the block connect whatever the circuit breakers say, for retries that wait on their own"""
+    token = _bypassed.set(True)
+    try:
+        yield
+    finally:
+        _bypassed.reset(token)
+
+
+_breakers = WeakKeyDictionary()
+_breakers_lock = threading.Lock()
+_breaker_settings = {"threshold": 5, "reset_seconds": 30.0}
+
+
+def breaker_for(dialect) -> CircuitBreaker:
+    """Returns the circuit breaker of the engine that owns dialect"""
+    breaker = _breakers.get(dialect)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(dialect, CircuitBreaker(**_breaker_settings))
+    return breaker
+
+
+######################################################################
+#  R E T R I E S
+######################################################################
+def call(func, *args, on_retry=None, tries=None, delay=None, max_delay=None, **kwargs):
+    """
+    Runs func, retrying it after transient database errors
+
+    Args:
+        func (callable): the operation, which must be safe to run again
+        on_retry (callable): cleans up before the next attempt; by default the session is rolled back
+        tries (int): the number of attempts, DB_RETRY_TRIES if not given
+        delay (float): the first wait in seconds, DB_RETRY_DELAY if not given
+        max_delay (float): the longest wait in seconds, DB_RETRY_MAX_DELAY if not given
+    """
+    config = current_app.config
+    if on_retry is None:
+        from service.models import db  # pylint: disable=import-outside-toplevel
+        on_retry = db.session.rollback
+
+    def attempt():
+        try:
+            return func(*args, **kwargs)
+        except DBAPIError as error:
+            if classify(error) is None:
+                raise
+            on_retry()
+            raise TransientDatabaseError(error) from error
+
+    try:
+        return retry_call(
+            attempt,
+            exceptions=TransientDatabaseError,
+            tries=config.get("DB_RETRY_TRIES", 3) if tries is None else tries,
+            delay=config.get("DB_RETRY_DELAY", 0.05) if delay is None else delay,
+            max_delay=config.get("DB_RETRY_MAX_DELAY", 1.0) if max_delay is None else max_delay,
+            backoff=2,
+            jitter=(0, config.get("DB_RETRY_JITTER", 0.05)),
+            logger=logger,
+        )
+    except TransientDatabaseError as error:
+        raise translate(error.__cause__) from error.__cause__
+
+
+def _before_connect(dialect, *_args):
+    if not _bypassed.get():
+        breaker_for(dialect).check()
+
+
+def _before_execute(conn, *_args):
+    if not _bypassed.get():
+        breaker_for(conn.dialect).check()
+
+
+def _after_execute(conn, *_args):
+    breaker = breaker_for(conn.dialect)
+    if breaker.failures:
+        breaker.record_success()
+
+
+def _after_error(context):
+    if context.is_disconnect or classify(context.sqlalchemy_exception) == CONNECTION:
+        breaker_for(context.dialect).record_failure()
+
+
+def init_app(app):
+    """Puts a circuit breaker configured from the DB_BREAKER_* settings around every engine"""
+    _breaker_settings["threshold"] = app.config.get("DB_BREAKER_THRESHOLD", 5)
+    _breaker_settings["reset_seconds"] = app.config.get("DB_BREAKER_RESET_SECONDS", 30.0)
+    if not event.contains(Engine, "do_connect", _before_connect):
+        event.listen(Engine, "do_connect", _before_connect)
+        event.listen(Engine, "before_cursor_execute", _before_execute)
+        event.listen(Engine, "after_cursor_execute", _after_execute)
+        event.listen(Engine, "handle_error", _after_error)
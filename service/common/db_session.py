@@ -0,0 +1,117 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Request-scoped Sessions
+
+The session of a GET or HEAD request to the API is read only. With
+``READ_ONLY_MODE`` set to ``transaction`` (the default) its queries run
+in a ``BEGIN READ ONLY`` transaction, so PostgreSQL skips the write
+bookkeeping. With ``autocommit`` every query runs on its own without
+BEGIN and COMMIT round trips, each with its own snapshot. ``off`` leaves
+reads in ordinary read-write transactions.
+
+Whatever the method, the session's transaction ends and its connections
+go back to the pool when the request is torn down, and the time from
+the first BEGIN to that release is recorded in ``SESSION_DURATION``.
+"""
+import threading
+from time import perf_counter
+from flask import request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from service.common.metrics import Histogram
+
+READ_METHODS = frozenset(("GET", "HEAD"))
+
+# execution options giving an engine's connections each read-only mode
+READ_ONLY_OPTIONS = {
+    "transaction": {"postgresql_readonly": True},
+    "autocommit": {"isolation_level": "AUTOCOMMIT"},
+}
+
+SESSION_DURATION = Histogram()
+
+_option_engines = {}
+_lock = threading.Lock()
+
+
+def read_only_engine(engine, mode: str):
+    """Returns a copy of engine whose connections are read only in the given mode"""
+    key = (engine, mode)
+    option_engine = _option_engines.get(key)
+    if option_engine is None:
+        with _lock:
+            option_engine = _option_engines.setdefault(key, engine.execution_options(**READ_ONLY_OPTIONS[mode]))
+    return option_engine
+
+
+class RoutingSession(Session):
+    """A session that reads from the request's replica, read only if the request is"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # never flush to a replica or through a read-only connection
+        if bind is not None or self._flushing:
+            return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        engine = self.info.get("replica") or super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        mode = self.info.get("read_only")
+        return read_only_engine(engine, mode) if mode else engine
+
+
+def is_read_request() -> bool:
+    """Tells whether the request is a read from the API"""
+    return request.blueprint == "api" and request.method in READ_METHODS
+
+
+def _session_began(session, _transaction, _connection):
+    session.info.setdefault("began_at", perf_counter())
+
+
+def read_only_mode(config) -> str:
+    """Returns the READ_ONLY_MODE setting, transaction by default"""
+    mode = config.get("READ_ONLY_MODE", "transaction")
+    if mode not in ("off", *READ_ONLY_OPTIONS):
+        raise RuntimeError(f"READ_ONLY_MODE must be one of off, {', '.join(READ_ONLY_OPTIONS)}; not {mode!r}")
+    return mode
+
+
+def init_app(app):
+    """Makes API reads read only and releases every session at request end"""
+    # pylint: disable=import-outside-toplevel
+    from service.models import db
+
+    read_only_mode(app.config)
+    if not event.contains(db.session, "after_begin", _session_began):
+        event.listen(db.session, "after_begin", _session_began)
+
+    @app.before_request
+    def read_only_session():  # pylint: disable=unused-variable
+        """Makes the session of a read request read only"""
+        current = read_only_mode(app.config)
+        if current != "off" and is_read_request():
+            db.session.info["read_only"] = current
+
+    @app.teardown_request
+    def release_session(_exc):  # pylint: disable=unused-variable
+        """Ends the request's transaction and returns its connections to the pool"""
+        session = db.session()
+        if session.in_transaction():
+            session.rollback()  # a handler that wrote has committed already
+        began_at = session.info.pop("began_at", None)
+        if began_at is not None:
+            SESSION_DURATION.observe(perf_counter() - began_at)
+        session.info.pop("read_only", None)
+        session.info.pop("replica", None)
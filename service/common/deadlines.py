@@ -0,0 +1,126 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Request Deadlines
+
+Every request gets a time budget: ``REQUEST_DEADLINES`` by endpoint,
+otherwise ``REQUEST_DEADLINE_SECONDS``. A client may ask for another
+budget with the ``X-Request-Deadline`` header (in seconds), up to
+``REQUEST_DEADLINE_MAX_SECONDS``.
+
+Each database transaction of the request starts with
+``SET LOCAL statement_timeout`` set to what is left of the budget, so
+PostgreSQL cancels a statement that would outlive the request; the
+request then fails with 504. A statement that would start after the
+deadline is not sent at all and the request fails with 503. In
+autocommit mode there is no transaction to scope the setting to, so
+only the 503 check applies.
+"""
+import math
+import time
+import threading
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.exceptions import GatewayTimeout, ServiceUnavailable
+
+DEADLINE_HEADER = "X-Request-Deadline"
+QUERY_CANCELED = "57014"  # PostgreSQL SQLSTATE of a statement_timeout
+
+TIMEOUTS = Counter()
+_lock = threading.Lock()
+
+
+class DeadlineError(Exception):
+    """A request ran out of time"""
+
+
+class DeadlineExceeded(DeadlineError, ServiceUnavailable):
+    """The request deadline passed before a statement could be sent"""
+
+    description = "The request deadline expired before it could be served"
+
+
+class StatementTimeout(DeadlineError, GatewayTimeout):
+    """PostgreSQL cancelled a statement that would have outlived the request"""
+
+    description = "The database did not answer before the request deadline"
+
+
+def count_timeout(endpoint: str):
+    """Counts a request to endpoint that ran out of time"""
+    with _lock:
+        TIMEOUTS[endpoint] += 1
+
+
+def budget_for(app, endpoint: str, headers=None) -> float:
+    """Returns the time budget in seconds of a request to endpoint, with the current request's headers by default"""
+    budget = app.config.get("REQUEST_DEADLINES", {}).get(endpoint, app.config.get("REQUEST_DEADLINE_SECONDS", 30.0))
+    requested = (request.headers if headers is None else headers).get(DEADLINE_HEADER)
+    if requested:
+        try:
+            value = float(requested)
+        except ValueError:
+            value = math.nan
+        if math.isfinite(value):
+            budget = value  # otherwise keep the configured budget
+    return min(max(budget, 0.0), app.config.get("REQUEST_DEADLINE_MAX_SECONDS", 60.0))
+
+
+def remaining() -> float:
+    """Returns the seconds left before the current request's deadline, or None"""
+    if not has_request_context() or "deadline" not in g:
+        return None
+    return g.deadline - time.monotonic()
+
+
+def _set_statement_timeout(_session, _transaction, connection):
+    left = remaining()
+    if left is not None and not connection.connection.driver_connection.autocommit:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(int(left * 1000), 1)}")
+
+
+def _check_deadline(*_args):
+    left = remaining()
+    if left is not None and left <= 0:
+        count_timeout(request.endpoint)
+        raise DeadlineExceeded()
+
+
+def _translate_timeout(context):
+    sqlstate = getattr(context.original_exception, "sqlstate", None)
+    if sqlstate == QUERY_CANCELED and remaining() is not None:
+        count_timeout(request.endpoint)
+        raise StatementTimeout() from context.original_exception
+
+
+def init_app(app):
+    """Gives every request a deadline and enforces it on the database"""
+    # pylint: disable=import-outside-toplevel
+    from service.models import db
+
+    @app.before_request
+    def start_deadline():  # pylint: disable=unused-variable
+        """Starts the clock on the request's budget"""
+        g.deadline = time.monotonic() + budget_for(app, request.endpoint)
+
+    if not event.contains(db.session, "after_begin", _set_statement_timeout):
+        event.listen(db.session, "after_begin", _set_statement_timeout)
+    if not event.contains(Engine, "before_cursor_execute", _check_deadline):
+        event.listen(Engine, "before_cursor_execute", _check_deadline)
+        event.listen(Engine, "handle_error", _translate_timeout)
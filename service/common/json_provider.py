@@ -0,0 +1,172 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+JSON Providers
+
+Flask JSON providers that understand the types our models use. Both
+encode ``Decimal`` as a string (so prices never lose precision),
+``datetime`` as ISO 8601 and ``Status`` by name. Request bodies read
+with ``request.get_json()`` are decoded the other way round: fractional
+numbers become ``Decimal``, the audit timestamps ``datetime`` and known
+status names ``Status``.
+
+``orjson`` is used when it is installed; otherwise the stdlib ``json``
+module is used. Select one explicitly with the ``JSON_PROVIDER`` setting.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from flask import Request, current_app
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+from service.common import tracing
+from service.common.order_status import Status
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+DATETIME_KEYS = frozenset(("created_at", "updated_at"))
+
+
+def encode_default(value):
+    """Encodes the types JSON does not know about"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def decode_object(obj: dict) -> dict:
+    """Turns the well-known keys of a decoded JSON object back into Python types"""
+    for key in DATETIME_KEYS.intersection(obj):
+        value = obj[key]
+        if isinstance(value, str):
+            try:
+                obj[key] = datetime.fromisoformat(value)
+            except ValueError:
+                pass  # leave it to the model to report
+    value = obj.get("status")
+    if isinstance(value, str) and value.upper() in Status.__members__:
+        obj["status"] = Status[value.upper()]
+    return obj
+
+
+def _decode_tree(value):
+    """Applies the request decoding to a document orjson has parsed"""
+    if isinstance(value, dict):
+        return decode_object({key: _decode_tree(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [_decode_tree(item) for item in value]
+    if isinstance(value, float):
+        # repr() is the shortest string that round-trips, i.e. what was sent
+        return Decimal(repr(value))
+    return value
+
+
+######################################################################
+#  S T D L I B   P R O V I D E R
+######################################################################
+class StdlibJSONProvider(DefaultJSONProvider):
+    """The stdlib json module with native Decimal, datetime and Status support"""
+
+    default = staticmethod(encode_default)
+
+    def loads_typed(self, s):
+        """Decodes a request body into Decimal, datetime and Status values"""
+        return json.loads(s, parse_float=Decimal, object_hook=decode_object)
+
+
+######################################################################
+#  O R J S O N   P R O V I D E R
+######################################################################
+class OrjsonProvider(JSONProvider):
+    """An orjson backed provider, encoding straight to bytes"""
+
+    sort_keys = False
+
+    def _option(self, **kwargs) -> int:
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=encode_default, option=self._option(**kwargs)).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def loads_typed(self, s):
+        """Decodes a request body into Decimal, datetime and Status values"""
+        return _decode_tree(orjson.loads(s))
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=encode_default, option=self._option())
+        return self._app.response_class(body, mimetype="application/json")
+
+
+######################################################################
+#  R E Q U E S T   D E C O D I N G
+######################################################################
+class _TypedJSON:
+    """Presents a provider to a request with the typed decoder as loads()"""
+
+    def __init__(self, provider):
+        self.loads = tracing.traced("json decode")(provider.loads_typed)
+        self.dumps = provider.dumps
+
+
+class TypedJSONRequest(Request):
+    """A request whose get_json() returns Decimal, datetime and Status values"""
+
+    @property
+    def json_module(self):
+        """The JSON module get_json() decodes with"""
+        if "_typed_json" not in self.__dict__:
+            self._typed_json = _TypedJSON(current_app.json)
+        return self._typed_json
+
+    @json_module.setter
+    def json_module(self, provider):
+        # Flask hands every request the app's provider
+        self._typed_json = _TypedJSON(provider)
+
+
+PROVIDERS = {
+    "stdlib": StdlibJSONProvider,
+    "orjson": OrjsonProvider,
+}
+
+
+def init_app(app):
+    """Installs the JSON provider selected by the JSON_PROVIDER setting"""
+    name = app.config.get("JSON_PROVIDER", "auto")
+    if name == "auto":
+        name = "orjson" if orjson is not None else "stdlib"
+    if name == "orjson" and orjson is None:
+        raise RuntimeError("JSON_PROVIDER is 'orjson' but orjson is not installed")
+    app.json = PROVIDERS[name](app)
+    app.json.sort_keys = False
+    app.request_class = TypedJSONRequest
@@ -19,20 +19,115 @@ Log Handlers
 
 This module contains utility functions to set up logging
 consistently
+
+The app's logger and the ``flask.app`` logger of the models and common
+modules write through gunicorn's handlers, as text or, with
+``LOG_FORMAT=json``, one JSON object per line. With ``LOG_QUEUE`` the
+request thread only puts each record on a queue, and a background thread
+formats and writes it. ``LOG_SAMPLING`` keeps one in N records of the
+loggers it names, such as ``flask.app.lookups`` for the lookups logged on
+every request, and drops the others before they are formatted.
 """
+import copy
+import json
+import atexit
 import logging
+from datetime import datetime, timezone
+from decimal import Decimal
+from itertools import count
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+# the loggers of the service's modules, which share the app logger's handlers
+LOGGERS = ("flask.app",)
+TEXT_FORMAT = "[%(asctime)s] [%(levelname)s] [%(module)s] %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S %z"
+# log arguments of these types can be formatted later in another thread
+PLAIN_TYPES = (str, int, float, Decimal, datetime, type(None))
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a single line of JSON"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps one in every `every` records, and every warning and error"""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(every, 1)
+        self.counter = count()
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or next(self.counter) % self.every == 0
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Puts records on a queue unformatted, for the listener's thread to format"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        # the state of an ORM object belongs to this thread's session, so
+        # anything but plain values is turned into text before it leaves
+        if isinstance(record.args, tuple):
+            record.args = tuple(arg if isinstance(arg, PLAIN_TYPES) else str(arg) for arg in record.args)
+        return record
 
 
 def init_logging(app, logger_name: str):
     """Set up logging for production"""
-    app.logger.propagate = False
     gunicorn_logger = logging.getLogger(logger_name)
-    app.logger.handlers = gunicorn_logger.handlers
-    app.logger.setLevel(gunicorn_logger.level)
+    handlers = gunicorn_logger.handlers
     # Make all log formats consistent
-    formatter = logging.Formatter(
-        "[%(asctime)s] [%(levelname)s] [%(module)s] %(message)s", "%Y-%m-%d %H:%M:%S %z"
-    )
-    for handler in app.logger.handlers:
+    if app.config.get("LOG_FORMAT", "text") == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT, DATE_FORMAT)
+    for handler in handlers:
         handler.setFormatter(formatter)
+
+    loggers = [app.logger]
+    if handlers:  # without handlers (not under gunicorn) the modules' records propagate as before
+        loggers += [logging.getLogger(name) for name in LOGGERS]
+        if app.config.get("LOG_QUEUE"):
+            listener = QueueListener(SimpleQueue(), *handlers, respect_handler_level=True)
+            handlers = [DeferredQueueHandler(listener.queue)]
+            _start(app, listener)
+    for logger in loggers:
+        logger.propagate = False
+        logger.handlers = handlers
+        logger.setLevel(gunicorn_logger.level)
+
+    for name, every in app.config.get("LOG_SAMPLING", {}).items():
+        logger = logging.getLogger(name)
+        for old in [f for f in logger.filters if isinstance(f, SamplingFilter)]:
+            logger.removeFilter(old)
+        logger.addFilter(SamplingFilter(every))
     app.logger.info("Logging handler established")
+
+
+def restart_listener(app):
+    """Starts the queue's listener again in a forked worker, which inherits no threads"""
+    listener = app.extensions.get("log_listener")
+    if listener is not None:
+        atexit.unregister(listener.stop)  # its thread stayed in the master
+        _start(app, QueueListener(listener.queue, *listener.handlers, respect_handler_level=True))
+
+
+def _start(app, listener: QueueListener):
+    app.extensions["log_listener"] = listener
+    listener.start()
+    atexit.register(listener.stop)  # writes what is still queued
@@ -0,0 +1,259 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Metrics
+
+Small in-process instruments for latencies and counts. A ``Histogram``
+keeps cumulative counts per upper bound, like a Prometheus histogram.
+
+A ``Family`` is a metric with labels, holding one instrument per set of
+label values. Families snapshot to plain dictionaries, which ``merge()``
+adds up across processes and ``render()`` writes in the Prometheus text
+format. Each gunicorn worker writes its snapshot to a file of its own in
+a shared directory (``write_snapshot()``), and ``collect()`` adds those
+files up, so any worker can answer for all of them. When a worker exits,
+its counters and histograms are added to one file for all the exited
+workers and its own file is removed (``mark_process_dead()``), so the
+directory does not grow with every worker restart.
+"""
+import os
+import json
+import threading
+from bisect import bisect_left
+
+# the file that holds what the exited workers counted
+DEAD_SNAPSHOT = "dead.json"
+
+# seconds, from half a millisecond up to the gunicorn worker timeout
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Counts observations into fixed buckets"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Records one observation"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @property
+    def count(self) -> int:
+        """The number of observations"""
+        return sum(self._counts)
+
+    @property
+    def sum(self) -> float:
+        """The total of all observations"""
+        return self._sum
+
+    def snapshot(self) -> dict:
+        """Returns the cumulative bucket counts, count and sum"""
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        buckets, running = {}, 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            buckets[str(bound)] = running
+        buckets["+Inf"] = running + counts[-1]
+        return {"buckets": buckets, "count": buckets["+Inf"], "sum": total}
+
+
+class Counter:
+    """A number that only goes up"""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        """Adds amount"""
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> float:
+        """Returns the current value"""
+        return self.value
+
+
+class Gauge(Counter):
+    """A number that goes up and down"""
+
+    def dec(self, amount: float = 1.0):
+        """Subtracts amount"""
+        self.inc(-amount)
+
+
+KINDS = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+
+class Family:
+    """A metric with labels: one instrument per set of label values"""
+
+    def __init__(self, name: str, documentation: str, kind: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.label_names = tuple(labels)
+        self.buckets = buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Returns the instrument of these label values, creating it the first time"""
+        child = self._children.get(values)
+        if child is None:  # only the first observation of a series takes the lock
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = Histogram(self.buckets) if self.kind == "histogram" else KINDS[self.kind]()
+                    self._children[values] = child
+        return child
+
+    def snapshot(self) -> dict:
+        """Returns the family and the values of all its series as plain data"""
+        return family(
+            self.name, self.documentation, self.kind, self.label_names,
+            [(list(values), child.snapshot()) for values, child in list(self._children.items())],
+        )
+
+
+def family(name: str, documentation: str, kind: str, labels=(), series=()) -> dict:
+    """Returns a snapshot of a family from its series, a list of (label values, value)"""
+    return {"name": name, "help": documentation, "type": kind, "labels": list(labels), "series": list(series)}
+
+
+######################################################################
+#  A G G R E G A T I O N
+######################################################################
+def _add(kind: str, total, value):
+    if kind != "histogram":
+        return total + value
+    buckets = {bound: total["buckets"].get(bound, 0) + count for bound, count in value["buckets"].items()}
+    return {"buckets": buckets, "count": total["count"] + value["count"], "sum": total["sum"] + value["sum"]}
+
+
+def merge(snapshots) -> list:
+    """Adds up lists of family snapshots, series by series"""
+    merged = {}
+    for families in snapshots:
+        for item in families:
+            target = merged.setdefault(item["name"], {**item, "series": {}})
+            for values, value in item["series"]:
+                key = tuple(values)
+                current = target["series"].get(key)
+                target["series"][key] = value if current is None else _add(item["type"], current, value)
+    return [{**item, "series": [(list(key), value) for key, value in item["series"].items()]}
+            for item in merged.values()]
+
+
+def _write(path: str, families: list):
+    with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+        json.dump(families, file)
+    os.replace(f"{path}.tmp", path)  # readers never see half a file
+
+
+def _read(path: str) -> list:
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def write_snapshot(directory: str, families: list, pid: int = None):
+    """Writes this process's snapshot to its file in directory"""
+    os.makedirs(directory, exist_ok=True)
+    _write(os.path.join(directory, f"{pid or os.getpid()}.json"), families)
+
+
+def read_snapshots(directory: str, exclude_pid: int = None) -> list:
+    """Returns the snapshots of the other processes in directory"""
+    snapshots = []
+    for name in os.listdir(directory) if os.path.isdir(directory) else ():
+        if not name.endswith(".json") or name == f"{exclude_pid}.json":
+            continue
+        try:
+            snapshots.append(_read(os.path.join(directory, name)))
+        except (OSError, ValueError):
+            continue  # removed or replaced while we read
+    return snapshots
+
+
+def mark_process_dead(directory: str, pid: int):
+    """
+    Adds the counters and histograms of a process that exited to the dead
+    processes' snapshot, and removes its own file; its gauges are dropped
+    """
+    path = os.path.join(directory, f"{pid}.json")
+    try:
+        families = _read(path)
+    except OSError:
+        return
+    except ValueError:
+        families = []  # it died writing; what it counted last is lost
+    dead = os.path.join(directory, DEAD_SNAPSHOT)
+    try:
+        previous = _read(dead)
+    except (OSError, ValueError):
+        previous = []
+    _write(dead, merge([previous, [item for item in families if item["type"] != "gauge"]]))
+    os.remove(path)
+
+
+def collect(directory: str, families: list) -> list:
+    """Adds this process's families to the snapshots the other processes left in directory"""
+    if not directory:
+        return merge([families])
+    return merge([families, *read_snapshots(directory, exclude_pid=os.getpid())])
+
+
+######################################################################
+#  P R O M E T H E U S   T E X T   F O R M A T
+######################################################################
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _sample(name: str, labels, value) -> str:
+    if not labels:
+        return f"{name} {value}"
+    text = ",".join(f'{label}="{_escape(label_value)}"' for label, label_value in labels)
+    return f"{name}{{{text}}} {value}"
+
+
+def render(families) -> str:
+    """Writes family snapshots in the Prometheus text exposition format"""
+    lines = []
+    for item in sorted(families, key=lambda f: f["name"]):
+        name = item["name"]
+        lines.append(f"# HELP {name} {item['help']}")
+        lines.append(f"# TYPE {name} {item['type']}")
+        for values, value in item["series"]:
+            labels = list(zip(item["labels"], values))
+            if item["type"] != "histogram":
+                lines.append(_sample(name, labels, value))
+                continue
+            for bound, count in value["buckets"].items():
+                lines.append(_sample(f"{name}_bucket", labels + [("le", bound)], count))
+            lines.append(_sample(f"{name}_sum", labels, value["sum"]))
+            lines.append(_sample(f"{name}_count", labels, value["count"]))
+    return "\n".join(lines) + "\n"
@@ -6,10 +6,14 @@ from enum import Enum
 
 
 class Status(Enum):
-    """Enumeration of valid Order Statuses"""
-    CREATED = 0
-    PAID = 1
-    CANCELED = 2
-    SHIPPED = 3
-    FULFILLED = 4
-    REFUNDED = 5
+    """Enumeration of valid Order Statuses
+
+    The values are the names so that every encoder, including the ones
+    that serialize enums by value, puts the same string on the wire.
+    """
+    CREATED = "CREATED"
+    PAID = "PAID"
+    CANCELED = "CANCELED"
+    SHIPPED = "SHIPPED"
+    FULFILLED = "FULFILLED"
+    REFUNDED = "REFUNDED"
@@ -0,0 +1,83 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Pre-fork Servers
+
+With gunicorn's ``preload_app`` the app, the flask-restx models and the
+SQLAlchemy mappers are built once in the master and shared with the
+workers copy-on-write. Database connections must not be shared that
+way: the master closes its own once the app is loaded, and each worker
+drops the pool it inherited without closing the connections in it,
+which belong to the master. Each worker then opens
+``DB_WARMUP_CONNECTIONS`` connections and runs the common queries once,
+so the first real requests find them connected and compiled.
+"""
+import logging
+from time import perf_counter
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import configure_mappers
+from service.common.db_retry import DatabaseUnavailable
+
+logger = logging.getLogger("flask.app")
+
+
+def dispose_engines(app, close: bool = True):
+    """
+    Empties the pools of the primary and replica engines
+
+    Args:
+        close (bool): close the pooled connections; False in a forked child,
+            where they still belong to the parent
+    """
+    # pylint: disable=import-outside-toplevel
+    from service.models import db
+    from service.common import replicas
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=close)
+        replicas.dispose(app, close=close)
+
+
+def warm_up(app):
+    """Opens DB_WARMUP_CONNECTIONS connections and runs the common queries once"""
+    # pylint: disable=import-outside-toplevel
+    from service.models import db, Order
+
+    started = perf_counter()
+    with app.app_context():
+        try:
+            pool_size = app.config.get("DB_POOL_SIZE", 5)
+            connections = [db.engine.connect() for _ in range(min(app.config.get("DB_WARMUP_CONNECTIONS", 0), pool_size))]
+            for connection in connections:
+                connection.close()  # back to the pool, still connected
+            Order.find(0)
+            Order.find_filtered()  # the list, with the SELECT of the items when there are Orders
+        except (SQLAlchemyError, DatabaseUnavailable) as error:
+            # the worker can still serve, also while the circuit breaker is open;
+            # its requests will connect on demand
+            logger.warning("Database warm-up failed: %s", error)
+        finally:
+            db.session.remove()
+    seconds = perf_counter() - started
+    app.extensions.setdefault("boot", {})["warmup_seconds"] = seconds
+    logger.info("Worker warmed up in %.3fs", seconds)
+
+
+def init_app(app):  # pylint: disable=unused-argument
+    """Builds the SQLAlchemy mappers now, in the master when the app is preloaded"""
+    configure_mappers()
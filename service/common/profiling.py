@@ -0,0 +1,123 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Request Profiling
+
+With ``PROFILING_ENABLED`` and a ``PROFILING_SECRET``, a request that
+sends the secret in the ``X-Profile`` header runs under cProfile, from
+routing through parsing, ``deserialize``, the SQL, marshalling and the
+JSON encoding of the body. Its profile is saved in ``PROFILING_DIR`` (if
+set) for ``python -m pstats`` or snakeviz, named in the ``X-Profile-Id``
+response header, and with ``X-Profile-Output: text`` the response is the
+``PROFILING_TOP`` functions by cumulative time, overall and in the
+service's own code, instead of the body.
+
+When profiling is off the app is not wrapped at all; when it is on, the
+other requests pay for one header lookup.
+"""
+import io
+import os
+import re
+import hmac
+import time
+import pstats
+import logging
+import cProfile
+
+logger = logging.getLogger("flask.app")
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+OUTPUT_HEADER = "HTTP_X_PROFILE_OUTPUT"
+SERVICE_FUNCTIONS = re.escape(os.path.dirname(os.path.dirname(__file__)))  # the files of the service package
+
+
+def profile_name(environ) -> str:
+    """Returns a file name for the profile of a request"""
+    path = re.sub(r"[^A-Za-z0-9]+", "_", environ.get("PATH_INFO", "")).strip("_") or "root"
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{environ['REQUEST_METHOD']}-{path}.prof"
+
+
+def report(profile: cProfile.Profile, top: int) -> str:
+    """Returns the top functions of a profile by cumulative time, then those of the service"""
+    out = io.StringIO()
+    stats = pstats.Stats(profile, stream=out).sort_stats(pstats.SortKey.CUMULATIVE)
+    stats.print_stats(top)
+    stats.print_stats(SERVICE_FUNCTIONS, top)
+    return out.getvalue()
+
+
+class ProfilingMiddleware:  # pylint: disable=too-few-public-methods
+    """Runs the requests that carry the secret under cProfile"""
+
+    def __init__(self, wsgi_app, secret: str, directory: str = "", top: int = 40):
+        self.wsgi_app = wsgi_app
+        self.secret = secret.encode("utf-8")
+        self.directory = directory
+        self.top = top
+
+    def __call__(self, environ, start_response):
+        token = environ.get(PROFILE_HEADER)
+        if token is None or not hmac.compare_digest(token.encode("utf-8"), self.secret):
+            return self.wsgi_app(environ, start_response)
+
+        started = {}
+
+        def capture(status, headers, exc_info=None):  # pylint: disable=unused-argument
+            started.update(status=status, headers=headers)
+            return lambda data: None  # the body is collected below
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            result = self.wsgi_app(environ, capture)
+            try:
+                body = b"".join(result)  # streamed bodies are produced here, under the profiler
+            finally:
+                getattr(result, "close", lambda: None)()
+        finally:
+            profile.disable()
+
+        headers = list(started["headers"])
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            name = profile_name(environ)
+            profile.dump_stats(os.path.join(self.directory, name))
+            headers.append(("X-Profile-Id", name))
+            logger.info("Saved the profile of %s %s as %s", environ["REQUEST_METHOD"], environ.get("PATH_INFO"), name)
+        if environ.get(OUTPUT_HEADER, "").lower() == "text":
+            body = report(profile, self.top).encode("utf-8")
+            headers = [(key, value) for key, value in headers if key.lower() not in ("content-type", "content-length",
+                                                                                     "content-encoding")]
+            headers += [("Content-Type", "text/plain; charset=utf-8"), ("Content-Length", str(len(body))),
+                        ("X-Profiled-Status", started["status"])]
+            start_response("200 OK", headers)
+            return [body]
+        start_response(started["status"], headers)
+        return [body]
+
+
+def init_app(app):
+    """Wraps the app in the profiling middleware when PROFILING_ENABLED"""
+    if not app.config.get("PROFILING_ENABLED"):
+        return
+    secret = app.config.get("PROFILING_SECRET")
+    if not secret:
+        logger.warning("Profiling stays off without a PROFILING_SECRET")
+        return
+    app.wsgi_app = ProfilingMiddleware(
+        app.wsgi_app, secret, app.config.get("PROFILING_DIR", ""), app.config.get("PROFILING_TOP", 40)
+    )
@@ -0,0 +1,132 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Read Replicas
+
+When ``DATABASE_REPLICA_URIS`` lists one or more read replicas, GET and
+HEAD requests to the API read from a replica (round robin) and every
+other request uses the primary. A client that has just written is sent
+to the primary for ``REPLICA_STICKY_SECONDS`` so it reads its own
+writes: the write response carries the deadline both as a cookie and
+as a header, and the client may return either. The replica is used
+through ``db_session.RoutingSession``. Replicas lag behind the primary,
+so only what was read from the primary goes into the shared Order cache,
+and a client that has just written does not read from that cache either.
+"""
+import math
+import time
+import threading
+from itertools import count
+from flask import current_app, request
+from sqlalchemy import create_engine
+from service.common.db_session import is_read_request
+
+STICKY_COOKIE = "read_primary_until"
+STICKY_HEADER = "X-Read-Primary-Until"
+
+_lock = threading.Lock()
+
+
+class _Replicas:
+    """The replica engines of one worker process"""
+
+    def __init__(self, uris, engine_options):
+        self.engines = [create_engine(uri, **engine_options) for uri in uris]
+        self._next = count()
+
+    def choose(self):
+        """Returns the next replica engine"""
+        return self.engines[next(self._next) % len(self.engines)]
+
+    def dispose(self, close: bool = True):
+        """Closes every replica connection, or just forgets them when close is False"""
+        for engine in self.engines:
+            engine.dispose(close=close)
+
+
+def get_replicas(app=None):
+    """Returns this process's replica engines, creating them on first use, or None"""
+    app = app or current_app
+    uris = app.config.get("DATABASE_REPLICA_URIS")
+    if not uris:
+        return None
+    replicas = app.extensions.get("replicas")
+    if replicas is None:
+        with _lock:
+            replicas = app.extensions.get("replicas")
+            if replicas is None:
+                options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+                replicas = app.extensions["replicas"] = _Replicas(uris, options)
+    return replicas
+
+
+def dispose(app=None, close: bool = True):
+    """Disposes of the replica engines; they are created again when next needed"""
+    app = app or current_app
+    replicas = app.extensions.pop("replicas", None)
+    if replicas is not None:
+        replicas.dispose(close)
+
+
+def _sticky_until() -> float:
+    value = request.cookies.get(STICKY_COOKIE) or request.headers.get(STICKY_HEADER)
+    try:
+        return float(value) if value else 0.0
+    except ValueError:
+        return 0.0
+
+
+def is_sticky() -> bool:
+    """Tells whether the request comes from a client that has just written, which reads the primary"""
+    return _sticky_until() > time.time()
+
+
+def reads_replica() -> bool:
+    """Tells whether the request's session reads from a replica"""
+    from service.models import db  # pylint: disable=import-outside-toplevel
+
+    return db.session.info.get("replica") is not None
+
+
+def init_app(app):
+    """Routes API reads to the replicas and keeps writers on the primary"""
+    # pylint: disable=import-outside-toplevel
+    from service.models import db
+
+    @app.before_request
+    def choose_replica():  # pylint: disable=unused-variable
+        """Reads from a replica unless the client has just written"""
+        if not is_read_request() or is_sticky():
+            return
+        replicas = get_replicas(app)
+        if replicas is not None:
+            db.session.info["replica"] = replicas.choose()
+
+    @app.after_request
+    def stick_to_primary(response):  # pylint: disable=unused-variable
+        """Sends a client that has written to the primary for a while"""
+        if (
+            request.blueprint == "api"
+            and not is_read_request()
+            and response.status_code < 400
+            and app.config.get("DATABASE_REPLICA_URIS")
+        ):
+            seconds = app.config.get("REPLICA_STICKY_SECONDS", 5)
+            until = f"{time.time() + seconds:.3f}"
+            response.set_cookie(STICKY_COOKIE, until, max_age=math.ceil(seconds), httponly=True, samesite="Lax")
+            response.headers[STICKY_HEADER] = until
+        return response
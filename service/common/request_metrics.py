@@ -0,0 +1,197 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Request Metrics
+
+Records the latency and response size of every request by flask-restx
+namespace and route, the requests in flight, and the SQL statements each
+request runs and the time they take (see service.common.sql_accounting). ``families()`` adds what the other
+modules count: the connection pool, the compiled statement cache, the
+shared cache, session durations, deadline timeouts and the circuit
+breaker.
+
+With ``METRICS_DIR`` set, as the gunicorn configuration does, each
+worker writes its metrics there at most every ``METRICS_FLUSH_SECONDS``
+and when it exits, and /metrics adds up those of every worker.
+"""
+from time import perf_counter, monotonic
+from flask import current_app, g, request
+from service.common import db_pool, db_retry, deadlines, shared_cache, sql_accounting, statement_cache
+from service.common.db_session import SESSION_DURATION
+from service.common.metrics import Family, family, write_snapshot
+
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+REQUEST_SECONDS = Family(
+    "orders_http_request_duration_seconds", "Time to handle a request", "histogram",
+    ("namespace", "route", "method", "status"),
+)
+IN_FLIGHT = Family("orders_http_requests_in_flight", "Requests being handled", "gauge")
+RESPONSE_BYTES = Family(
+    "orders_http_response_size_bytes", "Size of the response body as sent", "histogram",
+    ("namespace", "route", "method"), buckets=SIZE_BUCKETS,
+)
+STATEMENTS = Family(
+    "orders_db_statements_per_request", "SQL statements run by a request", "histogram",
+    ("namespace", "route"), buckets=STATEMENT_BUCKETS,
+)
+SQL_SECONDS = Family(
+    "orders_db_seconds_per_request", "Time a request spent running SQL statements", "histogram",
+    ("namespace", "route"),
+)
+FAMILIES = (REQUEST_SECONDS, IN_FLIGHT, RESPONSE_BYTES, STATEMENTS, SQL_SECONDS)
+
+_namespaces = {}
+_flushed = {"at": monotonic()}
+
+
+def _namespace(app, endpoint: str) -> str:
+    if not _namespaces:
+        from service.api import api  # pylint: disable=import-outside-toplevel
+
+        _namespaces.update({route.resource: ns.name for ns in api.namespaces for route in ns.resources})
+    view = app.view_functions.get(endpoint)
+    return _namespaces.get(getattr(view, "view_class", None), "")
+
+
+def route_labels() -> tuple:
+    """Returns the flask-restx namespace and the URL rule of the request"""
+    return _namespace(current_app, request.endpoint), request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def endpoint_labels(app, endpoint: str) -> tuple:
+    """Returns the flask-restx namespace and the URL rule of an endpoint of app"""
+    return _namespace(app, endpoint), next(app.url_map.iter_rules(endpoint)).rule
+
+
+def record(app, labels: tuple, method: str, status: int, seconds: float, size: int = None):
+    """Records a finished request by its (namespace, route) labels, and flushes when it is time"""
+    REQUEST_SECONDS.labels(*labels, method, str(status)).observe(seconds)
+    if size is not None:
+        RESPONSE_BYTES.labels(*labels, method).observe(size)
+    if monotonic() - _flushed["at"] >= app.config.get("METRICS_FLUSH_SECONDS", 5):
+        flush(app)
+
+
+######################################################################
+#  R E Q U E S T   H O O K S
+######################################################################
+def _request_started():
+    g.request_metrics = {"started": perf_counter()}
+    IN_FLIGHT.labels().inc()
+
+
+def _response_ready(response):
+    stats = g.get("request_metrics")
+    if stats is not None:
+        stats["status"] = response.status_code
+        stats["size"] = response.content_length  # None when streamed
+    return response
+
+
+def _request_finished(_exc):
+    stats = g.pop("request_metrics", None)
+    if stats is None:
+        return
+    IN_FLIGHT.labels().dec()
+    labels = route_labels()
+    sql = sql_accounting.current()
+    if sql is not None:
+        STATEMENTS.labels(*labels).observe(sql.count)
+        SQL_SECONDS.labels(*labels).observe(sql.seconds)
+    record(current_app, labels, request.method, stats.get("status", 500), perf_counter() - stats["started"],
+           stats.get("size"))
+
+
+######################################################################
+#  W H A T   T H E   O T H E R   M O D U L E S   C O U N T
+######################################################################
+def _pool_families(engine) -> list:
+    pool = db_pool.pool_status(engine)
+    families = [
+        family("orders_db_pool_size", "Connections the pool keeps open", "gauge", (), [([], pool["size"])]),
+        family("orders_db_pool_connections", "Connections of the pool by state", "gauge", ("state",), [
+            (["checked_out"], pool["checked_out"]), (["checked_in"], pool["checked_in"]),
+            (["overflow"], max(pool["overflow"], 0)),  # negative while the pool is not full
+        ]),
+    ]
+    if "checkouts" in pool:
+        for name, documentation in (
+            ("checkouts", "Connections taken from the pool"),
+            ("waits", "Checkouts that found no idle connection"),
+            ("wait_seconds", "Time spent waiting for a connection"),
+            ("timeouts", "Checkouts that gave up waiting"),
+        ):
+            families.append(family(f"orders_db_pool_{name}_total", documentation, "counter", (), [([], pool[name])]))
+        families.append(family(
+            "orders_db_pool_checkout_seconds", "Time to check out a connection", "histogram", (),
+            [([], pool["checkout_latency"])],
+        ))
+    return families
+
+
+def _cache_families(engine) -> list:
+    compiled = statement_cache.cache_status(engine, current_app.config)
+    families = [
+        family("orders_db_compiled_cache_entries", "Statements in SQLAlchemy's compiled cache", "gauge", (),
+               [([], compiled["size"])]),
+        family("orders_db_compiled_cache_lookups_total", "Compiled cache lookups by outcome", "counter", ("outcome",),
+               [([outcome], compiled[outcome]) for outcome in ("hits", "misses", "uncached")]),
+    ]
+    cache = shared_cache.get_cache()
+    if cache is not None:
+        families.append(family(
+            "orders_shared_cache_operations_total", "Shared cache operations by outcome", "counter", ("outcome",),
+            [([outcome], count) for outcome, count in cache.stats.items()],
+        ))
+    return families
+
+
+def families() -> list:
+    """Returns snapshots of every metric of this process"""
+    from service.models import db  # pylint: disable=import-outside-toplevel
+
+    return [
+        *(item.snapshot() for item in FAMILIES),
+        *_pool_families(db.engine),
+        *_cache_families(db.engine),
+        family("orders_db_session_seconds", "Time from a session's BEGIN to the release of its connection",
+               "histogram", (), [([], SESSION_DURATION.snapshot())]),
+        family("orders_request_timeouts_total", "Requests that ran out of time by endpoint", "counter", ("endpoint",),
+               [([endpoint or ""], count) for endpoint, count in dict(deadlines.TIMEOUTS).items()]),
+        family("orders_db_circuit_open", "1 while the database circuit breaker is open", "gauge", (),
+               [([], int(db_retry.breaker_for(db.engine.dialect).state == "open"))]),
+    ]
+
+
+def flush(app):
+    """Writes this worker's metrics to METRICS_DIR, if it is set"""
+    directory = app.config.get("METRICS_DIR")
+    if directory:
+        with app.app_context():
+            write_snapshot(directory, families())
+    _flushed["at"] = monotonic()
+
+
+def init_app(app):
+    """Times every request"""
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    app.before_request(_request_started)
+    app.after_request(_response_ready)
+    app.teardown_request(_request_finished)
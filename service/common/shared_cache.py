@@ -0,0 +1,324 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Shared Cache
+
+A small key/value cache kept in a memory-mapped file so that every
+gunicorn worker on the same host reads and writes the same entries.
+
+The segment is split into fixed-size slots grouped into sets. A key
+hashes to one set and may live in any slot of that set; when the set is
+full the oldest entry is evicted. Every entry is stamped with the
+segment generation, so bumping the generation invalidates everything
+at once without touching the slots.
+
+Readers never take a lock: each slot carries a sequence number that
+writers make odd while they are copying data in, and a reader that sees
+an odd or changed sequence simply treats the lookup as a miss. Writers
+serialize on an advisory ``flock`` on the segment file.
+"""
+import os
+import json
+import time
+import fcntl
+import mmap
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+from itertools import chain
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from service.models import db, Order, OrderItem
+
+logger = logging.getLogger("flask.app")
+
+MAGIC = b"ORDCACHE"
+VERSION = 1
+
+# magic, version, slots, slot size, ways, generation
+HEADER = struct.Struct("<8sIIIIQ")
+HEADER_SIZE = 64
+GENERATION_OFFSET = 24
+
+# sequence, payload length, key hash, generation, stored at
+SLOT = struct.Struct("<IIQQd")
+SEQUENCE = struct.Struct("<I")
+KEY_LENGTH = struct.Struct("<H")
+
+
+def default_path() -> str:
+    """Returns the default location of the segment, preferring tmpfs"""
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "orders-cache")
+
+
+def _hash(key: bytes) -> int:
+    """Returns a stable, non-zero 64-bit hash (the builtin hash() is salted per process)"""
+    value = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+    return value or 1
+
+
+######################################################################
+#  S H A R E D   C A C H E
+######################################################################
+class SharedCache:  # pylint: disable=too-many-instance-attributes
+    """A fixed-size, set-associative cache in a shared memory segment"""
+
+    def __init__(self, path: str, slots: int = 1024, slot_size: int = 4096, ways: int = 4, ttl: float = 30.0):
+        if slot_size <= SLOT.size + KEY_LENGTH.size:
+            raise ValueError(f"slot_size must be larger than {SLOT.size + KEY_LENGTH.size} bytes")
+        ways = max(1, min(ways, slots))
+        self.path = path
+        self.slots = slots - slots % ways
+        self.slot_size = slot_size
+        self.ways = ways
+        self.sets = self.slots // ways
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0, "oversize": 0}
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = HEADER_SIZE + self.slots * slot_size
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if not self._header_matches(size):
+                logger.info("Initializing shared cache segment %s (%d slots)", path, self.slots)
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, HEADER.pack(MAGIC, VERSION, self.slots, slot_size, ways, 1), 0)
+            self._map = mmap.mmap(self._fd, size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _header_matches(self, size: int) -> bool:
+        """Checks whether an existing segment has the layout we expect"""
+        if os.fstat(self._fd).st_size != size:
+            return False
+        magic, version, slots, slot_size, ways, _ = HEADER.unpack(os.pread(self._fd, HEADER.size, 0))
+        return (magic, version, slots, slot_size, ways) == (MAGIC, VERSION, self.slots, self.slot_size, self.ways)
+
+    @property
+    def generation(self) -> int:
+        """The current generation of the segment"""
+        return struct.unpack_from("<Q", self._map, GENERATION_OFFSET)[0]
+
+    def _offsets(self, key_hash: int):
+        """Returns the slot offsets of the set a key hashes to"""
+        first = HEADER_SIZE + (key_hash % self.sets) * self.ways * self.slot_size
+        return range(first, first + self.ways * self.slot_size, self.slot_size)
+
+    def _is_live(self, generation: int, stored_at: float, current: int, now: float) -> bool:
+        return generation == current and (not self.ttl or now - stored_at < self.ttl)
+
+    ##################################################
+    # READ PATH
+    ##################################################
+
+    def get(self, key: str):
+        """Returns the bytes stored under key or None on a miss"""
+        raw_key = key.encode("utf-8")
+        key_hash = _hash(raw_key)
+        current = self.generation
+        now = time.time()
+        for offset in self._offsets(key_hash):
+            seq, length, slot_hash, generation, stored_at = SLOT.unpack_from(self._map, offset)
+            if slot_hash != key_hash or seq & 1:
+                continue
+            if not self._is_live(generation, stored_at, current, now):
+                break
+            start = offset + SLOT.size
+            record = self._map[start:start + length]
+            if SEQUENCE.unpack_from(self._map, offset)[0] != seq:
+                break  # a writer raced us, treat it as a miss
+            key_length = KEY_LENGTH.unpack_from(record)[0]
+            if record[KEY_LENGTH.size:KEY_LENGTH.size + key_length] != raw_key:
+                continue
+            self.stats["hits"] += 1
+            return record[KEY_LENGTH.size + key_length:]
+        self.stats["misses"] += 1
+        return None
+
+    ##################################################
+    # WRITE PATH
+    ##################################################
+
+    def set(self, key: str, value: bytes) -> bool:
+        """Stores value under key, returns False if it does not fit in a slot"""
+        raw_key = key.encode("utf-8")
+        record = KEY_LENGTH.pack(len(raw_key)) + raw_key + value
+        if len(record) > self.slot_size - SLOT.size:
+            self.stats["oversize"] += 1
+            return False
+        key_hash = _hash(raw_key)
+        with self._exclusive():
+            current = self.generation
+            now = time.time()
+            offset = self._choose_slot(key_hash, current, now)
+            self._write_slot(offset, len(record), key_hash, current, now, record)
+        self.stats["sets"] += 1
+        return True
+
+    def delete(self, key: str) -> None:
+        """Removes key from the cache if it is present"""
+        key_hash = _hash(key.encode("utf-8"))
+        with self._exclusive():
+            for offset in self._offsets(key_hash):
+                if SLOT.unpack_from(self._map, offset)[2] == key_hash:
+                    self._write_slot(offset, 0, 0, 0, 0.0, b"")
+
+    def invalidate(self) -> None:
+        """Invalidates every entry by moving the segment to a new generation"""
+        with self._exclusive():
+            struct.pack_into("<Q", self._map, GENERATION_OFFSET, self.generation + 1)
+
+    def close(self) -> None:
+        """Unmaps the segment and closes the file"""
+        self._map.close()
+        os.close(self._fd)
+
+    def _choose_slot(self, key_hash: int, current: int, now: float) -> int:
+        """Picks the slot for key_hash: its own slot, a free one, or the oldest"""
+        free, victim, oldest = None, None, None
+        for offset in self._offsets(key_hash):
+            _, _, slot_hash, generation, stored_at = SLOT.unpack_from(self._map, offset)
+            if slot_hash == key_hash:
+                return offset
+            if not slot_hash or not self._is_live(generation, stored_at, current, now):
+                free = offset if free is None else free
+            elif oldest is None or stored_at < oldest:
+                victim, oldest = offset, stored_at
+        if free is not None:
+            return free
+        self.stats["evictions"] += 1
+        return victim
+
+    def _write_slot(self, offset, length, key_hash, generation, stored_at, record):  # pylint: disable=too-many-arguments
+        seq = SEQUENCE.unpack_from(self._map, offset)[0]
+        SEQUENCE.pack_into(self._map, offset, (seq + 1) & 0xFFFFFFFF)
+        start = offset + SLOT.size
+        self._map[start:start + len(record)] = record
+        SLOT.pack_into(self._map, offset, (seq + 1) & 0xFFFFFFFF, length, key_hash, generation, stored_at)
+        SEQUENCE.pack_into(self._map, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def _exclusive(self):
+        return _SegmentLock(self._lock, self._fd)
+
+
+class _SegmentLock:
+    """Holds the in-process lock and the cross-process file lock together"""
+
+    def __init__(self, lock, fd):
+        self._lock = lock
+        self._fd = fd
+
+    def __enter__(self):
+        self._lock.acquire()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+
+
+######################################################################
+#  F L A S K   I N T E G R A T I O N
+######################################################################
+def get_cache():
+    """Returns the shared cache for the current app or None if it is disabled"""
+    if not has_app_context() or not current_app.config.get("SHARED_CACHE_ENABLED"):
+        return None
+    cache = current_app.extensions.get("shared_cache")
+    if cache is None:
+        config = current_app.config
+        cache = SharedCache(
+            config.get("SHARED_CACHE_PATH") or default_path(),
+            slots=config.get("SHARED_CACHE_SLOTS", 1024),
+            slot_size=config.get("SHARED_CACHE_SLOT_SIZE", 4096),
+            ways=config.get("SHARED_CACHE_WAYS", 4),
+            ttl=config.get("SHARED_CACHE_TTL", 30.0),
+        )
+        current_app.extensions["shared_cache"] = cache
+    return cache
+
+
+def order_key(order_id) -> str:
+    """Returns the cache key for a serialized Order"""
+    return f"order:{order_id}"
+
+
+def fetch(key: str):
+    """Returns the JSON document cached under key, or None"""
+    cache = get_cache()
+    payload = cache.get(key) if cache else None
+    return None if payload is None else json.loads(payload)
+
+
+def store(key: str, data) -> None:
+    """Caches a JSON document under key if the cache is enabled"""
+    cache = get_cache()
+    if cache:
+        cache.set(key, json.dumps(data).encode("utf-8"))
+
+
+def _order_keys(session):
+    """Returns the cache keys of every Order touched by a flush"""
+    keys = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Order):
+            keys.add(order_key(obj.id))
+        elif isinstance(obj, OrderItem):
+            order_id = obj.order_id if obj.order_id is not None else getattr(obj.order, "id", None)
+            keys.add(order_key(order_id))
+    return keys
+
+
+def _after_flush(session, _flush_context):
+    session.info.setdefault("shared_cache_keys", set()).update(_order_keys(session))
+
+
+def _after_commit(session):
+    keys = session.info.pop("shared_cache_keys", None)
+    cache = get_cache()
+    if keys and cache:
+        for key in keys:
+            cache.delete(key)
+
+
+def _after_rollback(session):
+    session.info.pop("shared_cache_keys", None)
+
+
+def _after_bulk(context):
+    """Bulk UPDATE/DELETE statements do not say which rows they hit, so drop everything"""
+    cache = get_cache()
+    if cache and context.mapper.class_ in (Order, OrderItem):
+        cache.invalidate()
+
+
+def init_app(app):
+    """Evicts cached Orders whenever a commit changes them"""
+    app.extensions.setdefault("shared_cache", None)
+    for name, listener in (
+        ("after_flush", _after_flush),
+        ("after_commit", _after_commit),
+        ("after_rollback", _after_rollback),
+        ("after_bulk_update", _after_bulk),
+        ("after_bulk_delete", _after_bulk),
+    ):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
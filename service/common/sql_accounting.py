@@ -0,0 +1,152 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+SQL Accounting
+
+Every SQL statement run while handling a request is timed and counted
+against the request, grouped by its fingerprint: the statement with its
+parameters and literals replaced by ``?``. When the response is ready:
+
+* a request that spent ``SQL_SLOW_REQUEST_SECONDS`` or more running SQL
+  is logged with the ``SQL_TOP_STATEMENTS`` fingerprints it spent most
+  time on;
+* a fingerprint run ``SQL_REPEAT_THRESHOLD`` times or more, like a lazy
+  load per row of a list, is logged as a likely N+1 query, or raised as
+  an ``NPlusOneError`` with ``SQL_N_PLUS_ONE_RAISE``, so tests fail on
+  such regressions.
+"""
+import re
+import logging
+from functools import lru_cache
+from time import perf_counter
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("flask.app")
+
+_PATTERNS = (
+    (re.compile(r"%\(\w+\)s(::\w+)?"), "?"),  # bound parameters
+    (re.compile(r"'(?:[^']|'')*'"), "?"),  # string literals
+    (re.compile(r"\b\d+(\.\d+)?\b"), "?"),  # numbers
+    (re.compile(r"\(\?(, \?)*\)"), "(...)"),  # IN lists of any length
+    (re.compile(r"\s+"), " "),
+)
+
+
+class NPlusOneError(AssertionError):
+    """A request ran the same statement over and over"""
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement: str) -> str:
+    """Returns the statement with its parameters and literals replaced by ?"""
+    for pattern, replacement in _PATTERNS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class RequestSql:
+    """The SQL statements of one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}  # fingerprint: [count, seconds]
+
+    def record(self, statement: str, seconds: float):
+        """Adds a statement that took seconds"""
+        self.count += 1
+        self.seconds += seconds
+        entry = self.statements.setdefault(fingerprint(statement), [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def top(self, limit: int) -> list:
+        """Returns (fingerprint, count, seconds) of the statements that took longest"""
+        ranked = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+        return [(text, count, seconds) for text, (count, seconds) in ranked[:limit]]
+
+    def repeated(self, threshold: int) -> list:
+        """Returns (fingerprint, count) of the statements run threshold times or more"""
+        return [(text, count) for text, (count, _) in self.statements.items() if count >= threshold]
+
+
+def current() -> RequestSql:
+    """Returns the SQL accounting of the current request, or None outside a request"""
+    return g.get("request_sql") if has_request_context() else None
+
+
+_SELECT_LIST = re.compile(r"^SELECT .+? FROM ")
+
+
+def _shorten(text: str, length: int = 160) -> str:
+    """Leaves out the columns of a SELECT and cuts the rest at length"""
+    text = _SELECT_LIST.sub("SELECT ... FROM ", text)
+    return text if len(text) <= length else text[:length - 3] + "..."
+
+
+######################################################################
+#  H O O K S
+######################################################################
+def _statement_started(conn, _cursor, _statement, _parameters, _context, _executemany):
+    conn.info["statement_started"] = perf_counter()
+
+
+def _statement_finished(conn, _cursor, statement, _parameters, _context, _executemany):
+    sql = current()
+    if sql is not None:
+        sql.record(statement, perf_counter() - conn.info["statement_started"])
+
+
+def _request_started():
+    g.request_sql = RequestSql()
+
+
+def check(response):
+    """Reports the request's slow SQL and repeated statements"""
+    sql = current()
+    if sql is None:
+        return response
+    config = current_app.config
+    threshold = config.get("SQL_REPEAT_THRESHOLD", 0)
+    repeated = sql.repeated(threshold) if threshold else []
+    if repeated:
+        message = f"{request.method} {request.path} repeated " + "; ".join(
+            f"{count}x {_shorten(text)}" for text, count in repeated
+        )
+        if config.get("SQL_N_PLUS_ONE_RAISE"):
+            raise NPlusOneError(message)
+        logger.warning("Likely N+1 queries: %s", message)
+    slow = config.get("SQL_SLOW_REQUEST_SECONDS", 0)
+    if slow and sql.seconds >= slow:
+        logger.warning(
+            "Slow SQL: %s %s ran %d statements in %.3fs; top: %s",
+            request.method, request.path, sql.count, sql.seconds,
+            "; ".join(f"{count}x {seconds * 1000:.1f}ms {_shorten(text)}"
+                      for text, count, seconds in sql.top(config.get("SQL_TOP_STATEMENTS", 5))),
+        )
+    return response
+
+
+def init_app(app):
+    """Counts every statement against the request that runs it"""
+    app.before_request(_request_started)
+    app.after_request(check)
+    if not event.contains(Engine, "before_cursor_execute", _statement_started):
+        event.listen(Engine, "before_cursor_execute", _statement_started)
+        event.listen(Engine, "after_cursor_execute", _statement_finished)
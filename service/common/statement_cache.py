@@ -0,0 +1,113 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Statement Caches
+
+Two caches keep a statement from being prepared over and over:
+
+* SQLAlchemy compiles each statement to SQL once and keeps the result
+  in the engine's compiled cache (``DB_QUERY_CACHE_SIZE`` entries).
+  Every execution is counted as a hit or a miss, so a cache that is too
+  small shows up as misses that keep growing after warm-up.
+* psycopg prepares a statement on the server once it has run 5 times
+  on a connection (its own default), so PostgreSQL stops re-planning
+  it; ``DB_PREPARED_STATEMENTS`` sets that threshold to
+  ``DB_PREPARE_THRESHOLD`` instead. Prepared statements belong to a
+  server connection, which a transaction-pooling proxy such as
+  PgBouncer does not keep for us; set ``DB_TRANSACTION_POOLER`` and
+  they are turned off whatever the other settings say.
+"""
+import logging
+import threading
+from collections import Counter
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import CacheStats
+
+logger = logging.getLogger("flask.app")
+
+# each thread counts its own lookups without a lock; lookups() adds them up
+_local = threading.local()
+_counters = []  # every thread's Counter, so that the counts outlive the threads
+_lock = threading.Lock()
+_OUTCOMES = {
+    CacheStats.CACHE_HIT: "hits",
+    CacheStats.CACHE_MISS: "misses",
+}
+
+
+PSYCOPG_PREPARE_THRESHOLD = 5  # what psycopg uses unless told otherwise
+
+
+def prepare_threshold(config):
+    """Returns psycopg's prepare_threshold for the settings; None turns prepared statements off"""
+    if config.get("DB_TRANSACTION_POOLER"):
+        return None
+    if config.get("DB_PREPARED_STATEMENTS"):
+        return config.get("DB_PREPARE_THRESHOLD", PSYCOPG_PREPARE_THRESHOLD)
+    return PSYCOPG_PREPARE_THRESHOLD
+
+
+def connect_args(config) -> dict:
+    """Returns the connect_args that set prepare_threshold, empty to keep psycopg's default"""
+    if config.get("DB_TRANSACTION_POOLER") or config.get("DB_PREPARED_STATEMENTS"):
+        return {"prepare_threshold": prepare_threshold(config)}
+    return {}
+
+
+def lookups() -> Counter:
+    """Returns the compiled cache lookups of every thread so far by outcome"""
+    total = Counter()
+    with _lock:
+        counters = list(_counters)
+    for counter in counters:
+        total.update(counter)
+    return total
+
+
+def cache_status(engine, config) -> dict:
+    """Returns the engine's compiled cache size, the lookups so far and the prepare threshold"""
+    cache = engine._compiled_cache  # pylint: disable=protected-access
+    counts = lookups()
+    hits, misses = counts["hits"], counts["misses"]
+    return {
+        "size": len(cache) if cache is not None else 0,
+        "capacity": cache.capacity if cache is not None else 0,
+        "hits": hits,
+        "misses": misses,
+        "uncached": counts["uncached"],
+        "hit_ratio": hits / (hits + misses) if hits + misses else None,
+        "prepare_threshold": prepare_threshold(config),
+    }
+
+
+def _count_lookup(_conn, _cursor, _statement, _parameters, context, _executemany):
+    counter = getattr(_local, "counter", None)
+    if counter is None:
+        # every key exists from the start, so lookups() never sees the dict grow
+        counter = _local.counter = Counter(hits=0, misses=0, uncached=0)
+        with _lock:
+            _counters.append(counter)
+    counter[_OUTCOMES.get(context.cache_hit, "uncached")] += 1
+
+
+def init_app(app):
+    """Counts the compiled cache lookups of every engine"""
+    if app.config.get("DB_PREPARED_STATEMENTS") and app.config.get("DB_TRANSACTION_POOLER"):
+        logger.warning("Prepared statements are off behind a transaction pooler (DB_TRANSACTION_POOLER)")
+    if not event.contains(Engine, "before_cursor_execute", _count_lookup):
+        event.listen(Engine, "before_cursor_execute", _count_lookup)
@@ -0,0 +1,236 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Request Tracing
+
+With ``TRACING_ENABLED`` every request is a trace of nested spans: the
+request itself, routing, the view, ``reqparse`` parsing, decoding the
+body, ``Order.deserialize``, each SQL statement, marshalling and JSON
+encoding. The code marks its spans with ``span()`` or ``traced``, which
+cost one context variable lookup while no trace is being recorded, so
+they stay in place when tracing is off; only the middleware that starts
+the traces is left out.
+
+A finished trace is handed to an exporter as events of the Chrome trace
+format, "complete" events with microsecond timestamps, carrying the
+W3C-style trace and span ids in their ``args``. ``FileExporter`` appends
+them to ``TRACING_FILE``, one JSON object per line, and otherwise
+``MemoryExporter`` keeps the last ``TRACING_BUFFER`` traces. To look at
+a file in Perfetto or chrome://tracing, turn it into an array::
+
+    jq -s . traces.jsonl > traces.json
+"""
+import os
+import json
+import threading
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter_ns, time_ns
+from flask.ctx import RequestContext
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from service.common.sql_accounting import fingerprint
+
+CATEGORY = "orders"
+TRACE_HEADER = "X-Trace-Id"
+
+# turns perf_counter_ns() into microseconds since the epoch
+_EPOCH_OFFSET_NS = time_ns() - perf_counter_ns()
+
+_current = ContextVar("trace", default=None)
+
+
+class Trace:
+    """The spans of one request"""
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.stack = []  # ids of the open spans, innermost last
+        self.events = []
+
+    def record(self, name: str, started: int, ended: int, span_id: str, parent_id: str, attributes: dict):
+        """Adds a finished span; times are perf_counter_ns() values"""
+        self.events.append({
+            "name": name,
+            "cat": CATEGORY,
+            "ph": "X",
+            "ts": (started + _EPOCH_OFFSET_NS) // 1000,
+            "dur": (ended - started) // 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": {"trace_id": self.trace_id, "span_id": span_id, "parent_id": parent_id, **attributes},
+        })
+
+
+def current() -> Trace:
+    """Returns the trace being recorded, or None"""
+    return _current.get()
+
+
+class _Span:
+    """A span of the current trace, timed from __enter__ to __exit__"""
+
+    __slots__ = ("trace", "name", "attributes", "span_id", "parent_id", "started")
+
+    def __init__(self, trace: Trace, name: str, attributes: dict):
+        self.trace = trace
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = self.trace.stack[-1] if self.trace.stack else None
+        self.trace.stack.append(self.span_id)
+        self.started = perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        ended = perf_counter_ns()
+        self.trace.stack.pop()
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.trace.record(self.name, self.started, ended, self.span_id, self.parent_id, self.attributes)
+
+
+class _NoSpan:
+    """What span() returns while no trace is being recorded"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **attributes):
+    """Returns a context manager that times its block as a span of the current trace"""
+    trace = _current.get()
+    return _NO_SPAN if trace is None else _Span(trace, name, attributes)
+
+
+def traced(name: str):
+    """Decorates a function so that each call is a span named name"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+######################################################################
+#  E X P O R T E R S
+######################################################################
+class MemoryExporter:
+    """Keeps the events of the last traces in memory"""
+
+    def __init__(self, size: int = 100):
+        self.traces = deque(maxlen=size)
+
+    def export(self, events: list):
+        """Keeps the events of a trace"""
+        self.traces.append(events)
+
+
+class FileExporter:
+    """Appends the events of every trace to a file, one JSON object per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, events: list):
+        """Appends the events of a trace"""
+        lines = "".join(json.dumps(item, default=str) + "\n" for item in events)
+        with self.lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(lines)
+
+
+######################################################################
+#  R E Q U E S T S
+######################################################################
+class TracingMiddleware:  # pylint: disable=too-few-public-methods
+    """Records a trace of each request and exports it when the app has answered"""
+
+    def __init__(self, wsgi_app, exporter):
+        self.wsgi_app = wsgi_app
+        self.exporter = exporter
+
+    def __call__(self, environ, start_response):
+        trace = Trace()
+        root = _Span(trace, "request", {"method": environ["REQUEST_METHOD"], "path": environ.get("PATH_INFO", "")})
+
+        def add_trace_id(status, headers, exc_info=None):
+            root.attributes["status"] = int(status.split(" ", 1)[0])
+            return start_response(status, [*headers, (TRACE_HEADER, trace.trace_id)], exc_info)
+
+        token = _current.set(trace)
+        try:
+            with root:
+                return self.wsgi_app(environ, add_trace_id)
+        finally:
+            _current.reset(token)
+            self.exporter.export(trace.events)
+
+
+class TracedRequestContext(RequestContext):
+    """A request context whose URL matching is a span"""
+
+    def match_request(self):
+        with span("routing"):
+            super().match_request()
+
+
+def _statement_started(conn, _cursor, _statement, _parameters, _context, _executemany):
+    if _current.get() is not None:
+        conn.info["trace_statement_started"] = perf_counter_ns()
+
+
+def _statement_finished(conn, _cursor, statement, _parameters, _context, _executemany):
+    trace = _current.get()
+    started = conn.info.pop("trace_statement_started", None)
+    if trace is not None and started is not None:
+        text = fingerprint(statement)
+        trace.record(
+            f"SQL {text.split(' ', 1)[0]}", started, perf_counter_ns(), os.urandom(8).hex(),
+            trace.stack[-1] if trace.stack else None, {"db.statement": text},
+        )
+
+
+def exporter_for(config):
+    """Returns the exporter the TRACING_* settings ask for"""
+    if config.get("TRACING_FILE"):
+        return FileExporter(config["TRACING_FILE"])
+    return MemoryExporter(config.get("TRACING_BUFFER", 100))
+
+
+def init_app(app):
+    """Makes routing and the SQL statements spans, and traces every request when TRACING_ENABLED"""
+    app.request_context = lambda environ: TracedRequestContext(app, environ)
+    if not event.contains(Engine, "before_cursor_execute", _statement_started):
+        event.listen(Engine, "before_cursor_execute", _statement_started)
+        event.listen(Engine, "after_cursor_execute", _statement_finished)
+    if app.config.get("TRACING_ENABLED"):
+        exporter = app.extensions["tracing"] = exporter_for(app.config)
+        app.wsgi_app = TracingMiddleware(app.wsgi_app, exporter)
@@ -13,8 +13,118 @@ DATABASE_URI = os.getenv(
 # Configure SQLAlchemy
 SQLALCHEMY_DATABASE_URI = DATABASE_URI
 SQLALCHEMY_TRACK_MODIFICATIONS = False
-# SQLALCHEMY_POOL_SIZE = 2
+
+# What the app factory does to the schema: create (create_all), verify (check
+# the version with one query, leaving DDL to "flask db-upgrade") or off
+SCHEMA_MODE = os.getenv("SCHEMA_MODE", "create")
+
+# Optional read replicas (comma separated) for GET requests to the API, and
+# how long a client that has just written keeps reading from the primary
+DATABASE_REPLICA_URIS = [uri for uri in os.getenv("DATABASE_REPLICA_URIS", "").split(",") if uri]
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+
+# How GET requests to the API read: transaction (BEGIN READ ONLY), autocommit or off
+READ_ONLY_MODE = os.getenv("READ_ONLY_MODE", "transaction")
+
+# Request time budgets in seconds: the default, per endpoint ("endpoint=seconds,...")
+# and the most a client may ask for with the X-Request-Deadline header
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "25"))
+REQUEST_DEADLINES = {
+    endpoint.strip(): float(seconds)
+    for endpoint, _, seconds in (
+        item.partition("=") for item in os.getenv("REQUEST_DEADLINES", "api.orders_order_collection=10").split(",") if item
+    )
+}
+REQUEST_DEADLINE_MAX_SECONDS = float(os.getenv("REQUEST_DEADLINE_MAX_SECONDS", "25"))
+
+# Connection pool of each worker process: keep workers x (size + overflow)
+# x replicas below PostgreSQL's max_connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+DB_POOL_USE_LIFO = os.getenv("DB_POOL_USE_LIFO", "false").lower() == "true"
+# Statements: SQLAlchemy's compiled cache, and psycopg's server-side prepared
+# statements (psycopg's default threshold unless DB_PREPARED_STATEMENTS sets
+# DB_PREPARE_THRESHOLD; off behind a transaction-pooling proxy like PgBouncer)
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "500"))
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "false").lower() == "true"
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", "5"))
+DB_TRANSACTION_POOLER = os.getenv("DB_TRANSACTION_POOLER", "false").lower() == "true"
+# connections each gunicorn worker opens before it serves (at most DB_POOL_SIZE)
+DB_WARMUP_CONNECTIONS = int(os.getenv("DB_WARMUP_CONNECTIONS", "2"))
+# the ASGI app's async pool, which bounds its concurrent reads, and the threads
+# it runs the Flask app in for everything else
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "20"))
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "4"))
+
+# Retries of transient database errors (exponential backoff with jitter), and
+# the circuit breaker that fails fast after repeated connection errors
+DB_RETRY_TRIES = int(os.getenv("DB_RETRY_TRIES", "3"))
+DB_RETRY_DELAY = float(os.getenv("DB_RETRY_DELAY", "0.05"))
+DB_RETRY_MAX_DELAY = float(os.getenv("DB_RETRY_MAX_DELAY", "1.0"))
+DB_RETRY_JITTER = float(os.getenv("DB_RETRY_JITTER", "0.05"))
+DB_STARTUP_TRIES = int(os.getenv("DB_STARTUP_TRIES", "5"))
+DB_STARTUP_DELAY = float(os.getenv("DB_STARTUP_DELAY", "1.0"))
+DB_BREAKER_THRESHOLD = int(os.getenv("DB_BREAKER_THRESHOLD", "5"))
+DB_BREAKER_RESET_SECONDS = float(os.getenv("DB_BREAKER_RESET_SECONDS", "30"))
+
+# Cache of serialized Orders shared by all workers on a host
+SHARED_CACHE_ENABLED = os.getenv("SHARED_CACHE_ENABLED", "false").lower() == "true"
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "")
+SHARED_CACHE_SLOTS = int(os.getenv("SHARED_CACHE_SLOTS", "1024"))
+SHARED_CACHE_SLOT_SIZE = int(os.getenv("SHARED_CACHE_SLOT_SIZE", "4096"))
+SHARED_CACHE_WAYS = int(os.getenv("SHARED_CACHE_WAYS", "4"))
+SHARED_CACHE_TTL = float(os.getenv("SHARED_CACHE_TTL", "30"))
+
+# JSON encoder/decoder: auto (orjson when installed), orjson or stdlib
+JSON_PROVIDER = os.getenv("JSON_PROVIDER", "auto")
+
+# Response compression, in order of preference (zstd and br need optional packages)
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_ENCODINGS = tuple(os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(","))
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+COMPRESSION_BROTLI_LEVEL = int(os.getenv("COMPRESSION_BROTLI_LEVEL", "4"))
 
 # Secret for session management
 SECRET_KEY = os.getenv("SECRET_KEY", "sup3r-s3cr3t")
 LOGGING_LEVEL = logging.INFO
+
+# SQL of each request: log requests that spend SQL_SLOW_REQUEST_SECONDS on it
+# (0 is off) with their top statements, and statements repeated
+# SQL_REPEAT_THRESHOLD times (likely N+1 queries), which tests can make raise
+SQL_SLOW_REQUEST_SECONDS = float(os.getenv("SQL_SLOW_REQUEST_SECONDS", "0.5"))
+SQL_TOP_STATEMENTS = int(os.getenv("SQL_TOP_STATEMENTS", "5"))
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "5"))
+SQL_N_PLUS_ONE_RAISE = os.getenv("SQL_N_PLUS_ONE_RAISE", "false").lower() == "true"
+
+# Profiling of the requests that send PROFILING_SECRET in the X-Profile header:
+# off unless enabled and given a secret; profiles are saved in PROFILING_DIR
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_SECRET = os.getenv("PROFILING_SECRET", "")
+PROFILING_DIR = os.getenv("PROFILING_DIR", "")
+PROFILING_TOP = int(os.getenv("PROFILING_TOP", "40"))
+
+# Traces of every request with TRACING_ENABLED, appended to TRACING_FILE
+# (one Chrome trace event per line) or kept in memory, the last TRACING_BUFFER
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACING_FILE = os.getenv("TRACING_FILE", "")
+TRACING_BUFFER = int(os.getenv("TRACING_BUFFER", "100"))
+
+# Request metrics served at /metrics; under gunicorn each worker writes its own
+# to METRICS_DIR at most every METRICS_FLUSH_SECONDS and /metrics adds them up
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+# Log lines as text or json; LOG_QUEUE formats and writes them in a background
+# thread; LOG_SAMPLING keeps one in N records of a logger ("logger=N,...")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_QUEUE = os.getenv("LOG_QUEUE", "false").lower() == "true"
+LOG_SAMPLING = {
+    name.strip(): int(every)
+    for name, _, every in (item.partition("=") for item in os.getenv("LOG_SAMPLING", "").split(",") if item)
+}
@@ -0,0 +1,189 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Gunicorn Configuration
+
+Usage:
+    gunicorn --config python:service.gunicorn_config wsgi:app
+
+Workers and threads are sized from the CPU and memory limits of the
+container's cgroup (v2 or v1), not from the host's CPUs, which a pod
+with a limit of half a CPU cannot use. Every setting can be overridden
+with the GUNICORN_* environment variable named next to it.
+
+The app is preloaded in the master and shared with the workers; the
+hooks at the end keep database connections out of that sharing and
+warm each worker up before it serves (see service.common.prefork).
+"""
+import os
+import shutil
+import tempfile
+
+# gunicorn reads its settings from lower-case module globals
+# pylint: disable=invalid-name
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+UNLIMITED_MEMORY = 1 << 62  # cgroup v1 reports no limit as a number close to 2**63
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path, encoding="utf-8") as file:
+            return file.read().strip()
+    except OSError:
+        return ""
+
+
+def cpu_limit(root: str = CGROUP_ROOT) -> float:
+    """Returns the CPUs the cgroup may use, or None when it has no limit"""
+    fields = _read(os.path.join(root, "cpu.max")).split()  # v2: "<quota> <period>" or "max <period>"
+    if len(fields) == 2 and fields[0] != "max":
+        return int(fields[0]) / int(fields[1])
+    quota = _read(os.path.join(root, "cpu", "cpu.cfs_quota_us"))  # v1: -1 when unlimited
+    period = _read(os.path.join(root, "cpu", "cpu.cfs_period_us"))
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def memory_limit(root: str = CGROUP_ROOT) -> int:
+    """Returns the memory the cgroup may use in bytes, or None when it has no limit"""
+    for path in (os.path.join(root, "memory.max"), os.path.join(root, "memory", "memory.limit_in_bytes")):
+        value = _read(path)
+        if value.isdigit() and int(value) < UNLIMITED_MEMORY:
+            return int(value)
+    return None
+
+
+def available_cpus(root: str = CGROUP_ROOT) -> float:
+    """Returns the CPUs this process can use: the cgroup limit, else the CPUs it may run on"""
+    limit = cpu_limit(root)
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    return min(limit, cpus) if limit else cpus
+
+
+def worker_count(cpus: float, memory: int, worker_memory: int, reserved_memory: int) -> int:
+    """Returns 2 workers per CPU plus one, no more than fit in memory, and at least one"""
+    count = int(2 * cpus) + 1
+    if memory:
+        count = min(count, (memory - reserved_memory) // worker_memory)
+    return max(count, 1)
+
+
+def _env(name: str, default):
+    return type(default)(os.getenv(name, str(default)))
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() == "true"
+
+
+MEBIBYTE = 1 << 20
+
+# Server socket
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8080')}")
+backlog = _env("GUNICORN_BACKLOG", 256)  # connections waiting for a worker; more would only wait past their deadline
+
+# Build the app once in the master and fork the workers from it
+preload_app = _env_flag("GUNICORN_PRELOAD_APP", True)
+
+# Workers: gthread lets a worker serve other requests while one waits on the database
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = _env(
+    "GUNICORN_WORKERS",
+    worker_count(
+        available_cpus(),
+        memory_limit(),
+        worker_memory=_env("GUNICORN_WORKER_MEMORY_MB", 48) * MEBIBYTE,
+        reserved_memory=_env("GUNICORN_RESERVED_MEMORY_MB", 32) * MEBIBYTE,
+    ),
+)
+# keep threads within each worker's connection pool (DB_POOL_SIZE, 5 by default)
+threads = _env("GUNICORN_THREADS", 4 if worker_class == "gthread" else 1)
+keepalive = _env("GUNICORN_KEEPALIVE", 5)  # longer than the default 2s, for the ingress's reused connections
+timeout = _env("GUNICORN_TIMEOUT", 30)  # beyond REQUEST_DEADLINE_MAX_SECONDS
+graceful_timeout = _env("GUNICORN_GRACEFUL_TIMEOUT", 30)
+
+# Restart each worker after about this many requests to bound memory growth;
+# the jitter keeps the workers from all restarting at once
+max_requests = _env("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _env("GUNICORN_MAX_REQUESTS_JITTER", 100)
+
+# Heartbeat files in memory, since a container's disk can stall them
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+# Where the workers leave their metrics for /metrics to add up, unless
+# METRICS_DIR says otherwise. The server empties it when it starts and
+# removes it when it stops.
+METRICS_DIR = os.getenv("METRICS_DIR") or os.path.join(
+    worker_tmp_dir or tempfile.gettempdir(), f"orders-metrics-{os.getpid()}"
+)
+
+
+######################################################################
+#  S E R V E R   H O O K S
+######################################################################
+def when_ready(server):
+    """Closes the connections the master opened while loading the app"""
+    if server.cfg.preload_app:
+        from service.common import prefork  # pylint: disable=import-outside-toplevel
+
+        prefork.dispose_engines(server.app.wsgi())
+
+
+def post_fork(server, worker):  # pylint: disable=unused-argument
+    """Drops the pools inherited from the master without closing its connections"""
+    if server.cfg.preload_app:
+        # pylint: disable=import-outside-toplevel
+        from service.common import prefork, log_handlers
+
+        prefork.dispose_engines(server.app.wsgi(), close=False)
+        log_handlers.restart_listener(server.app.wsgi())  # the master's logging thread is not forked
+
+
+def worker_exit(server, worker):  # pylint: disable=unused-argument
+    """Writes the worker's last metrics before it goes"""
+    from service.common import request_metrics  # pylint: disable=import-outside-toplevel
+
+    request_metrics.flush(worker.wsgi)
+
+
+def child_exit(server, worker):  # pylint: disable=unused-argument
+    """Folds the metrics of a worker that exited into those of the exited workers"""
+    from service.common import metrics  # pylint: disable=import-outside-toplevel
+
+    metrics.mark_process_dead(METRICS_DIR, worker.pid)
+
+
+def on_starting(server):  # pylint: disable=unused-argument
+    """Forgets the metrics of a previous run"""
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+
+def on_exit(server):  # pylint: disable=unused-argument
+    """Removes the workers' metrics"""
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+
+def post_worker_init(worker):
+    """Connects and runs the common queries before the worker accepts requests"""
+    from service.common import prefork  # pylint: disable=import-outside-toplevel
+
+    worker.wsgi.config["METRICS_DIR"] = METRICS_DIR
+    prefork.warm_up(worker.wsgi)
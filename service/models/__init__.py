@@ -4,7 +4,8 @@ Models for Order and OrderItem
 All of the models are stored in this package
 """
 
-from .persistent_base import db, DataValidationError
+from .persistent_base import db, DataValidationError, unit_of_work
 from .orderitem import OrderItem
 from .order import Order
 from .order import Status
+from .schema import SchemaVersion, SchemaVersionError
@@ -4,12 +4,34 @@ Persistent Base class for database CRUD functions
 
 import logging
 from decimal import Decimal, InvalidOperation
-from datetime import datetime
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from service.common import tracing
 from service.common.order_status import Status
-from .persistent_base import db, PersistentBase, DataValidationError
+from .persistent_base import db, PersistentBase, DataValidationError, read
 from .orderitem import OrderItem
 
 logger = logging.getLogger("flask.app")
+lookup_logger = logging.getLogger("flask.app.lookups")
+
+
+def _as_status(value) -> Status:
+    """Accepts a Status or its name, as decoded by the JSON provider or not"""
+    return value if isinstance(value, Status) else Status[value.upper()]
+
+
+def _as_datetime(value) -> datetime:
+    """Accepts a datetime or its ISO 8601 form"""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def _set_timestamps(order, data: dict):
+    """Copies the timestamps the client sent; the database sets the others"""
+    for name in ("created_at", "updated_at"):
+        if data.get(name) is not None:
+            setattr(order, name, _as_datetime(data[name]))
+
 
 ######################################################################
 #  O R D E R   M O D E L
@@ -18,6 +40,8 @@ logger = logging.getLogger("flask.app")
 
 class Order(db.Model, PersistentBase):
     """Class that represents an Order"""
+
+    __mapper_args__ = {"eager_defaults": True}
     # Table Schema
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.String(16), nullable=False)
@@ -34,37 +58,55 @@ class Order(db.Model, PersistentBase):
         return sum((i.line_amount or 0) for i in self.orderitem)
 
     # Database auditing fields
-    created_at = db.Column(db.DateTime(), nullable=False, default=datetime.now())
+    # set by PostgreSQL and read back with INSERT/UPDATE ... RETURNING (eager_defaults)
+    created_at = db.Column(db.DateTime(), nullable=False, server_default=db.func.localtimestamp())
     updated_at = db.Column(
-        db.DateTime(), nullable=False, default=datetime.now(), onupdate=datetime.now()
+        db.DateTime(), nullable=False, server_default=db.func.localtimestamp(), onupdate=db.func.localtimestamp()
     )
 
-    orderitem = db.relationship("OrderItem", backref="order", passive_deletes=True)
+    orderitem = db.relationship("OrderItem", backref="order", passive_deletes=True, order_by="OrderItem.id")
 
     def __repr__(self):
         return (
             f"<Order id={self.id} customer_id={self.customer_id} status={self.status}>"
         )
 
-    def serialize(self) -> dict:
-        """Converts an Order into a dictionary"""
+    def serialize(self, native: bool = False) -> dict:
+        """
+        Converts an Order into a dictionary
 
-        order = {
-            "id": self.id,
-            "customer_id": self.customer_id,
-            "status": self.status.name,
-            "total_amount": str(self.total_amount),
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat(),
-            "orderitem": [],
-        }
+        Args:
+            native (bool): keep the Decimal and datetime values instead of
+                converting them to strings, for binary formats
+        """
+        if native:
+            order = {
+                "id": self.id,
+                "customer_id": self.customer_id,
+                "status": self.status.name,
+                "total_amount": self.total_amount,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+                "orderitem": [],
+            }
+        else:
+            order = {
+                "id": self.id,
+                "customer_id": self.customer_id,
+                "status": self.status.name,
+                "total_amount": str(self.total_amount),
+                "created_at": self.created_at.isoformat(),
+                "updated_at": self.updated_at.isoformat(),
+                "orderitem": [],
+            }
 
         # handle inner list of orderitem
         for orderitem in self.orderitem:
-            order["orderitem"].append(orderitem.serialize())
+            order["orderitem"].append(orderitem.serialize(native))
 
         return order
 
+    @tracing.traced("Order.deserialize")
     def deserialize(self, data) -> "Order":
         """
         Populates an Order from a dictionary
@@ -73,35 +115,36 @@ class Order(db.Model, PersistentBase):
             data (dict): A dictionary containing the resource data
         """
         try:
-            self.customer_id = data["customer_id"]
-            self.status = Status[data["status"].upper()]
-            self.created_at = datetime.fromisoformat(data["created_at"])
-            self.updated_at = datetime.fromisoformat(data["updated_at"])
+            # loading the items must not flush the changes made so far
+            with db.session.no_autoflush:
+                self.customer_id = data["customer_id"]
+                self.status = _as_status(data["status"])
+                _set_timestamps(self, data)
 
-            if "orderitem" in data:
-                for i in list(self.orderitem):
-                    db.session.delete(i)
+                if "orderitem" in data:
+                    for i in list(self.orderitem):
+                        db.session.delete(i)
 
-                self.orderitem = []
+                    self.orderitem = []
 
-            # handle inner list of orderitem
-            orderitem_list = data.get("orderitem", [])
-            for json_orderitem in orderitem_list:
-                orderitem = OrderItem()
-                orderitem.deserialize(json_orderitem)
-                self.orderitem.append(orderitem)
+                # handle inner list of orderitem
+                orderitem_list = data.get("orderitem", [])
+                for json_orderitem in orderitem_list:
+                    orderitem = OrderItem()
+                    orderitem.deserialize(json_orderitem)
+                    self.orderitem.append(orderitem)
 
-            parsed_total = data.get("total_amount", None)
-            computed_total = sum(i.line_amount for i in self.orderitem)
+                parsed_total = data.get("total_amount", None)
+                computed_total = sum(i.line_amount for i in self.orderitem)
 
-            if parsed_total is not None:
+                if parsed_total is not None:
 
-                if Decimal(str(parsed_total)) != computed_total:
-                    logger.debug(
-                        "Invalid attribute: Parsed total_amount %s not equals to computed total_amount %s",
-                        parsed_total,
-                        computed_total,
-                    )
+                    if Decimal(str(parsed_total)) != computed_total:
+                        logger.debug(
+                            "Invalid attribute: Parsed total_amount %s not equals to computed total_amount %s",
+                            parsed_total,
+                            computed_total,
+                        )
 
         except KeyError as error:
             raise DataValidationError(
@@ -124,5 +167,45 @@ class Order(db.Model, PersistentBase):
         Args:
             customer_id (string): the id of the customer you want to match
         """
-        logger.info("Processing customer_id query for %s ...", customer_id)
-        return cls.query.filter(cls.customer_id == customer_id).all()
+        lookup_logger.info("Processing customer_id query for %s ...", customer_id)
+        return read(cls.query.filter(cls.customer_id == customer_id).all)
+
+    @classmethod
+    def filtered(cls, status=None, customer_id=None, created_at=None):
+        """Returns a SELECT of the Orders that match the API's list filters
+
+        Args:
+            status (string): the name of a Status
+            customer_id (string): the id of the customer
+            created_at (string): an ISO 8601 date (the whole day) or date and time
+
+        Raises DataValidationError for an unknown status or a malformed date
+        """
+        statement = select(cls)
+        if status:
+            try:
+                statement = statement.where(cls.status == Status[status.upper()])
+            except KeyError as error:
+                raise DataValidationError(
+                    f"Unknown status '{status}'. Valid statuses: {[s.name for s in Status]}"
+                ) from error
+        if customer_id:
+            statement = statement.where(cls.customer_id == customer_id)
+        if created_at:
+            try:
+                moment = datetime.fromisoformat(created_at)
+            except ValueError as error:
+                raise DataValidationError("Invalid date format for created_at. Use ISO 8601.") from error
+            if len(created_at) <= 10:
+                start = datetime(moment.year, moment.month, moment.day)
+                statement = statement.where(cls.created_at >= start, cls.created_at < start + timedelta(days=1))
+            else:
+                statement = statement.where(cls.created_at == moment)
+        return statement
+
+    @classmethod
+    def find_filtered(cls, **filters):
+        """Returns all Orders that match the filters of filtered(), with their items"""
+        # one more SELECT for all the items instead of one per Order
+        statement = cls.filtered(**filters).options(selectinload(cls.orderitem))
+        return read(lambda: db.session.scalars(statement).all())
@@ -2,11 +2,14 @@
 Persistent Base class for database CRUD functions
 """
 
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 import logging
 from .persistent_base import db, PersistentBase, DataValidationError
 
 logger = logging.getLogger("flask.app")
+lookup_logger = logging.getLogger("flask.app.lookups")
+
+PRICE_QUANTUM = Decimal("0.01")  # the scale of the price column
 
 
 ######################################################################
@@ -19,6 +22,8 @@ class OrderItem(db.Model, PersistentBase):
     Class that represents an OrderItem
     """
 
+    __mapper_args__ = {"eager_defaults": True}
+
     # Table Schema
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(
@@ -36,8 +41,23 @@ class OrderItem(db.Model, PersistentBase):
     def __repr__(self):
         return f"<OrderItem id={self.id} order_id={self.order_id} product_id={self.product_id}>"
 
-    def serialize(self) -> dict:
-        """Converts an OrderItem into a dictionary"""
+    def serialize(self, native: bool = False) -> dict:
+        """
+        Converts an OrderItem into a dictionary
+
+        Args:
+            native (bool): keep the Decimal and int values instead of
+                converting them to strings, for binary formats
+        """
+        if native:
+            return {
+                "id": self.id,
+                "order_id": self.order_id,
+                "product_id": self.product_id,
+                "price": self.price,
+                "quantity": self.quantity,
+                "line_amount": self.line_amount,
+            }
         return {
             "id": self.id,
             "order_id": self.order_id,
@@ -57,10 +77,12 @@ class OrderItem(db.Model, PersistentBase):
         try:
             self.order_id = data["order_id"]
             self.product_id = data["product_id"]
-            self.price = Decimal(str(data["price"]))
+            price = Decimal(str(data["price"]))
+            # rounded the way PostgreSQL stores it, as the object is not reloaded after the write
+            self.price = price.quantize(PRICE_QUANTUM, rounding=ROUND_HALF_UP)
             self.quantity = int(data["quantity"])
 
-            computed_line = self.price * self.quantity
+            computed_line = price * self.quantity
 
             if "line_amount" in data and data["line_amount"] is not None:
                 parsed = Decimal(str(data["line_amount"]))
@@ -94,5 +116,5 @@ class OrderItem(db.Model, PersistentBase):
         Args:
             order_id (string): the id of the Order you want to match
         """
-        logger.info("Processing order_id query for %s ...", order_id)
+        lookup_logger.info("Processing order_id query for %s ...", order_id)
         return cls.query.filter(cls.order_id == order_id).all()
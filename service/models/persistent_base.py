@@ -20,11 +20,21 @@ Persistent Base class for database CRUD functions
 
 import logging
 from abc import abstractmethod
+from contextlib import contextmanager
 from flask_sqlalchemy import SQLAlchemy
+from werkzeug.exceptions import HTTPException
+from service.common import db_retry
+from service.common.db_session import RoutingSession
 
 logger = logging.getLogger("flask.app")
+# the lookups every request logs, which LOG_SAMPLING can thin out
+lookup_logger = logging.getLogger("flask.app.lookups")
 
-db = SQLAlchemy()
+# keys of db.session.info: how deep in units of work we are, and whether one has flushed yet
+UNIT_DEPTH = "unit_of_work_depth"
+UNIT_FLUSHED = "unit_of_work_flushed"
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 
 class DataValidationError(Exception):
@@ -53,15 +63,15 @@ class PersistentBase:
         Creates a Order to the database
         """
         logger.info("Creating %s", self)
-        # id must be none to generate next primary key
-        self.id = None
-        try:
+
+        def flush():
+            # id must be none to generate next primary key
+            self.id = None
             db.session.add(self)
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            logger.error("Error creating record: %s", self)
-            raise DataValidationError(e) from e
+            db.session.flush()
+
+        # a failed flush leaves the new object as it was, so it can be added again
+        self._save(flush, "creating")
 
     def update(self) -> None:
         """
@@ -70,34 +80,106 @@ class PersistentBase:
         logger.info("Updating %s", self)
         if not self.id:
             raise DataValidationError("Update called with empty ID field")
-        try:
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            logger.error("Error updating record: %s", self)
-            raise DataValidationError(e) from e
+        # a rollback would throw the changes away, so updates are not retried
+        self._save(db.session.flush, "updating", retry=False)
 
     def delete(self) -> None:
         """Removes a Order from the data store"""
         logger.info("Deleting %s", self)
-        try:
+
+        def flush():
             db.session.delete(self)
+            db.session.flush()
+
+        self._save(flush, "deleting")
+
+    def _save(self, flush, action: str, retry: bool = True) -> None:
+        """Flushes (with retries if allowed) and commits unless in a unit of work"""
+        info = db.session.info
+        # a retry rolls back, which would also lose what the unit of work has flushed so far
+        retry = retry and not info.get(UNIT_FLUSHED)
+        try:
+            if retry:
+                db_retry.call(flush)
+            else:
+                flush()
+            if info.get(UNIT_DEPTH):
+                info[UNIT_FLUSHED] = True
+                return
+            # the commit itself is never retried: it may have succeeded
             db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            logger.error("Error deleting record: %s", self)
-            raise DataValidationError(e) from e
+        except Exception as e:  # pylint: disable=broad-except
+            _raise_failure(e, f"{action} record: {self}")
+
+    @staticmethod
+    @contextmanager
+    def unit_of_work():
+        """
+        Saves everything done within it in one transaction
+
+        create(), update() and delete() only flush inside a unit of work, and
+        the outermost unit of work commits once at the end, without expiring
+        the objects. An error anywhere rolls back the whole unit. It can also
+        decorate a function.
+        """
+        info = db.session.info
+        depth = info.get(UNIT_DEPTH, 0)
+        info[UNIT_DEPTH] = depth + 1
+        try:
+            yield
+        except BaseException:
+            if depth == 0:
+                db.session.rollback()
+            raise
+        finally:
+            info[UNIT_DEPTH] = depth
+            if depth == 0:
+                info.pop(UNIT_FLUSHED, None)
+        if depth == 0:
+            # what the unit wrote stays loaded, so the response is built without another SELECT
+            session = db.session()
+            session.expire_on_commit = False
+            try:
+                db.session.commit()
+            except Exception as e:  # pylint: disable=broad-except
+                _raise_failure(e, "committing unit of work")
+            finally:
+                session.expire_on_commit = True
 
     @classmethod
     def all(cls):
         """Returns all of the records in the database"""
-        logger.info("Processing all records")
+        lookup_logger.info("Processing all records")
         # pylint: disable=no-member
-        return cls.query.all()
+        return read(cls.query.all)
 
     @classmethod
     def find(cls, by_id):
         """Finds a record by it's ID"""
-        logger.info("Processing lookup for id %s ...", by_id)
+        lookup_logger.info("Processing lookup for id %s ...", by_id)
         # pylint: disable=no-member
-        return cls.query.session.get(cls, by_id)
+        return read(cls.query.session.get, cls, by_id)
+
+
+def read(func, *args):
+    """Runs a query, retrying it after transient errors unless within a unit of work"""
+    if db.session.info.get(UNIT_DEPTH):
+        # a retry rolls back, which would silently lose what the unit has written
+        # so far; report the error once instead, and the unit rolls back as a whole
+        return db_retry.call(func, *args, tries=1, on_retry=lambda: None)
+    return db_retry.call(func, *args)
+
+
+def _raise_failure(error: Exception, what: str):
+    """Rolls back and raises the exception a failed save is reported as"""
+    db.session.rollback()
+    if isinstance(error, (HTTPException, DataValidationError)):
+        # deadlines and the circuit breaker already say what went wrong
+        raise error
+    if db_retry.classify(error):
+        raise db_retry.translate(error) from error
+    logger.error("Error %s", what)
+    raise DataValidationError(error) from error
+
+
+unit_of_work = PersistentBase.unit_of_work
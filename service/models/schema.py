@@ -0,0 +1,78 @@
+"""
+Schema Version
+
+The ``schema_version`` table holds the version of the schema in the
+database, so a starting worker can check it with one query instead of
+issuing DDL. ``upgrade()`` creates what is missing and records the
+version, then brings existing tables up to date with the statements in
+``MIGRATIONS``; it holds a PostgreSQL advisory lock while doing so, so workers
+and pods that upgrade at the same time do not race.
+"""
+
+import logging
+from sqlalchemy import insert, select, text, update
+from sqlalchemy.exc import ProgrammingError
+from .persistent_base import db
+
+logger = logging.getLogger("flask.app")
+
+# Bump whenever the tables change in a way old code or old schemas can't cope with
+SCHEMA_VERSION = 2
+
+# What turns a schema of the previous version into this one, for tables
+# create_all() finds already there; each statement must be safe to run again
+MIGRATIONS = {
+    2: (  # the database sets the timestamps a client leaves out
+        'ALTER TABLE "order" ALTER COLUMN created_at SET DEFAULT LOCALTIMESTAMP',
+        'ALTER TABLE "order" ALTER COLUMN updated_at SET DEFAULT LOCALTIMESTAMP',
+    ),
+}
+
+# an arbitrary key for pg_advisory_xact_lock(), the same for every process
+UPGRADE_LOCK_KEY = 0x6F72646572
+
+
+class SchemaVersionError(Exception):
+    """The database schema is missing or older than this code"""
+
+
+class SchemaVersion(db.Model):  # pylint: disable=too-few-public-methods
+    """The version of the schema in the database (a single row)"""
+
+    __tablename__ = "schema_version"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+
+
+def upgrade() -> int:
+    """Creates the missing tables and records SCHEMA_VERSION; returns the version"""
+    with db.engine.begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": UPGRADE_LOCK_KEY})
+        db.metadata.create_all(connection)
+        current = connection.execute(select(SchemaVersion.version).where(SchemaVersion.id == 1)).scalar()
+        for version in range((current or 0) + 1, SCHEMA_VERSION + 1):
+            for statement in MIGRATIONS.get(version, ()):
+                connection.execute(text(statement))
+        if current is None:
+            connection.execute(insert(SchemaVersion).values(id=1, version=SCHEMA_VERSION))
+        elif current < SCHEMA_VERSION:
+            connection.execute(update(SchemaVersion).where(SchemaVersion.id == 1).values(version=SCHEMA_VERSION))
+    logger.info("Database schema is at version %d", max(current or 0, SCHEMA_VERSION))
+    return max(current or 0, SCHEMA_VERSION)
+
+
+def verify() -> int:
+    """Checks with a single query that the database schema is recent enough; returns its version"""
+    with db.engine.connect() as connection:
+        try:
+            current = connection.execute(text("SELECT version FROM schema_version WHERE id = 1")).scalar()
+        except ProgrammingError as error:
+            raise SchemaVersionError("The database has no schema; run 'flask db-upgrade'") from error
+    if current is None or current < SCHEMA_VERSION:
+        raise SchemaVersionError(
+            f"The database schema is at version {current}, this code needs {SCHEMA_VERSION}; run 'flask db-upgrade'"
+        )
+    if current > SCHEMA_VERSION:
+        logger.warning("Database schema version %d is newer than this code's %d", current, SCHEMA_VERSION)
+    return current
@@ -3,7 +3,9 @@ Order and OrderItem Service - UI Routes Only
 """
 from flask import jsonify
 from flask import current_app as app
-from service.common import status
+from service.common import status, db_pool, db_session, deadlines, db_retry, statement_cache
+from service.common import metrics, request_metrics
+from service.models import db
 
 
 ######################################################################
@@ -15,6 +17,51 @@ def health_check():
     return jsonify(status=200, message="Healthy"), status.HTTP_200_OK
 
 
+######################################################################
+# GET POOL STATISTICS
+######################################################################
+@app.route("/health/pool")
+def pool_stats():
+    """Returns live statistics of the database connection pool"""
+    stats = db_pool.pool_status(db.engine)
+    stats["session_duration"] = db_session.SESSION_DURATION.snapshot()
+    stats["circuit"] = db_retry.breaker_for(db.engine.dialect).state
+    stats["statement_cache"] = statement_cache.cache_status(db.engine, app.config)
+    return jsonify(stats), status.HTTP_200_OK
+
+
+######################################################################
+# GET TIMEOUT COUNTS
+######################################################################
+@app.route("/health/timeouts")
+def timeout_stats():
+    """Returns the number of requests that ran out of time, by endpoint"""
+    return jsonify(dict(deadlines.TIMEOUTS)), status.HTTP_200_OK
+
+
+######################################################################
+# GET BOOT TIME
+######################################################################
+@app.route("/health/boot")
+def boot_stats():
+    """Returns how long this worker took to start"""
+    return jsonify(app.extensions.get("boot", {})), status.HTTP_200_OK
+
+
+######################################################################
+# GET METRICS
+######################################################################
+@app.route("/metrics")
+def prometheus_metrics():
+    """Returns the metrics of every worker in the Prometheus text format"""
+    families = request_metrics.families()
+    directory = app.config.get("METRICS_DIR")
+    if directory:
+        metrics.write_snapshot(directory, families)
+    body = metrics.render(metrics.collect(directory, families))
+    return body, status.HTTP_200_OK, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
 ######################################################################
 # GET INDEX
 ######################################################################
@@ -0,0 +1,41 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the Model Benchmarks
+"""
+from unittest import TestCase
+from benchmarks import bench_models
+
+
+class TestModelBenchmarks(TestCase):
+    """Model Benchmark Tests"""
+
+    def test_compare(self):
+        """It should report the cases slower than the baseline by more than the threshold"""
+        baseline = {"results": {"a[1]": 1.0, "b[1]": 1.0, "c[1]": 1.0}}
+        results = {"results": {"a[1]": 1.2, "b[1]": 1.5, "c[1]": 0.5, "new[1]": 9.0}}
+        self.assertEqual(bench_models.compare(results, baseline, 0.25), [("b[1]", 1.5, 1.0, 1.5)])
+        self.assertEqual(bench_models.compare(results, baseline, 0.1)[0][0], "a[1]")
+
+    def test_run(self):
+        """It should time every case at every size, as the stored baseline does"""
+        results = bench_models.run(sizes=(2,), repeat=1)
+        self.assertEqual(len(results["results"]), 6)
+        self.assertTrue(all(seconds > 0 for seconds in results["results"].values()))
+        baseline = bench_models._load(bench_models.DEFAULT_BASELINE)  # pylint: disable=protected-access
+        cases = {case.split("[")[0] for case in baseline["results"]}
+        self.assertEqual(cases, {case.split("[")[0] for case in results["results"]})
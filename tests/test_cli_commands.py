@@ -20,13 +20,15 @@ CLI Command Extensions for Flask
 
 # pylint: disable=duplicate-code
 import os
-from unittest import TestCase
+from unittest import TestCase, skipUnless
 from unittest.mock import patch, MagicMock
 from click.testing import CliRunner
+from benchmarks import bench_imports
 
 # pylint: disable=unused-import
 from wsgi import app  # noqa: F401
-from service.common.cli_commands import db_create  # noqa: E402
+from service import LazyAppGroup
+from service.common.cli_commands import db_create, db_upgrade  # noqa: E402
 
 
 class TestFlaskCLI(TestCase):
@@ -42,3 +44,48 @@ class TestFlaskCLI(TestCase):
         with patch.dict(os.environ, {"FLASK_APP": "wsgi:app"}, clear=True):
             result = self.runner.invoke(db_create)
             self.assertEqual(result.exit_code, 0)
+
+    @patch("service.common.cli_commands.schema")
+    def test_db_upgrade(self, schema_mock):
+        """It should call the db-upgrade command"""
+        schema_mock.upgrade.return_value = 1
+        with patch.dict(os.environ, {"FLASK_APP": "wsgi:app"}, clear=True):
+            result = self.runner.invoke(db_upgrade)
+            self.assertEqual(result.exit_code, 0)
+            self.assertIn("version 1", result.output)
+        schema_mock.upgrade.assert_called_once()
+
+    def test_commands_are_lazy(self):
+        """It should register the commands when the CLI first looks for them"""
+        group = LazyAppGroup("orders")
+        self.assertFalse(group.loaded)
+        ctx = MagicMock()
+        self.assertIn("db-upgrade", group.list_commands(ctx))
+        self.assertIs(group.get_command(ctx, "db-create"), db_create)
+        self.assertTrue(group.loaded)
+
+
+class TestImportTime(TestCase):
+    """Import Time Budget Tests"""
+
+    def test_parse(self):
+        """It should read the cumulative times of an -X importtime report"""
+        report = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       150 |        150 |   _io\n"
+            "import time:      7443 |     639514 | wsgi\n"
+        )
+        self.assertEqual(bench_imports.parse(report), {"_io": 0.00015, "wsgi": 0.639514})
+
+    def test_lazy_imports(self):
+        """It should start the service without importing the CLI commands"""
+        result = bench_imports.run("wsgi")
+        self.assertNotIn("service.common.cli_commands", result["modules"])
+
+    # wall-clock times depend on the machine and its load, so the budget is
+    # only checked when asked for, on the machine the budget was set for
+    @skipUnless(os.getenv("IMPORT_TIME_CHECK"), "set IMPORT_TIME_CHECK to check the import-time budget")
+    def test_within_budget(self):
+        """It should start the service within the import-time budget"""
+        result = bench_imports.run("wsgi")
+        self.assertLess(result["total"], bench_imports.DEFAULT_BUDGET)
@@ -0,0 +1,130 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for Response Compression
+"""
+import gzip
+import importlib.util
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+from flask import Flask, Response, jsonify
+from service.common import compression
+
+BIG = {"orders": [{"id": i, "customer_id": f"User{i:04d}", "status": "CREATED"} for i in range(200)]}
+CHUNK = b'{"id": 1, "status": "CREATED"}\n'
+
+
+def create_test_app(**config):
+    """Creates a small app with compression installed"""
+    app = Flask(__name__)
+    app.config.update(COMPRESSION_MIN_SIZE=1024, **config)
+    compression.init_app(app)
+
+    @app.route("/big")
+    def big():
+        return jsonify(BIG)
+
+    @app.route("/small")
+    def small():
+        return jsonify(status="ok")
+
+    @app.route("/stream/<int:count>")
+    def stream(count):
+        return Response((CHUNK for _ in range(count)), mimetype="application/json")
+
+    @app.route("/image")
+    def image():
+        return Response(b"x" * 4096, mimetype="image/png")
+
+    return app
+
+
+######################################################################
+#  C O M P R E S S I O N   T E S T   C A S E S
+######################################################################
+class TestCompression(TestCase):
+    """Response Compression Tests"""
+
+    def setUp(self):
+        self.app = create_test_app()
+        self.client = self.app.test_client()
+
+    def test_gzip(self):
+        """It should gzip large bodies for clients that accept it"""
+        resp = self.client.get("/big", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resp.headers["Vary"])
+        self.assertEqual(resp.headers["Content-Length"], str(len(resp.data)))
+        self.assertEqual(gzip.decompress(resp.data), self.client.get("/big").data)
+
+    def test_no_accept_encoding(self):
+        """It should not compress for clients that do not ask for it"""
+        resp = self.client.get("/big")
+        self.assertNotIn("Content-Encoding", resp.headers)
+        resp = self.client.get("/big", headers={"Accept-Encoding": "gzip;q=0"})
+        self.assertNotIn("Content-Encoding", resp.headers)
+
+    def test_small_body(self):
+        """It should not compress bodies under the threshold"""
+        resp = self.client.get("/small", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", resp.headers)
+
+    def test_not_compressible(self):
+        """It should not compress media types that are already compressed"""
+        resp = self.client.get("/image", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", resp.headers)
+
+    def test_streamed(self):
+        """It should compress a long stream as it goes"""
+        resp = self.client.get("/stream/500", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Length", resp.headers)
+        self.assertEqual(gzip.decompress(resp.data), CHUNK * 500)
+
+    def test_short_stream(self):
+        """It should send a stream under the threshold as it is"""
+        resp = self.client.get("/stream/2", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", resp.headers)
+        self.assertEqual(resp.data, CHUNK * 2)
+
+    def test_disabled(self):
+        """It should do nothing when disabled"""
+        client = create_test_app(COMPRESSION_ENABLED=False).test_client()
+        resp = client.get("/big", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", resp.headers)
+
+    def test_missing_optional_encoders(self):
+        """It should only offer encodings whose library is installed"""
+        with patch.object(compression.importlib, "import_module", side_effect=ImportError):
+            encodings = compression.available_encodings({})
+        self.assertEqual(list(encodings), ["gzip"])
+
+    @skipUnless(importlib.util.find_spec("zstandard"), "zstandard is not installed")
+    def test_zstd(self):
+        """It should prefer zstd when the client accepts it"""
+        import zstandard  # pylint: disable=import-outside-toplevel
+        resp = self.client.get("/big", headers={"Accept-Encoding": "gzip, zstd"})
+        self.assertEqual(resp.headers["Content-Encoding"], "zstd")
+        self.assertEqual(zstandard.ZstdDecompressor().decompressobj().decompress(resp.data), self.client.get("/big").data)
+
+    @skipUnless(importlib.util.find_spec("brotli"), "brotli is not installed")
+    def test_brotli(self):
+        """It should use brotli when the client prefers it"""
+        import brotli  # pylint: disable=import-outside-toplevel
+        resp = self.client.get("/stream/500", headers={"Accept-Encoding": "gzip;q=0.5, br"})
+        self.assertEqual(resp.headers["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(resp.data), CHUNK * 500)
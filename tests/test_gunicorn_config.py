@@ -0,0 +1,102 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the Gunicorn Configuration
+"""
+import os
+import importlib
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+from service import gunicorn_config
+from service.gunicorn_config import available_cpus, cpu_limit, memory_limit, worker_count
+
+MEBIBYTE = 1 << 20
+
+
+def write(root, path, value):
+    """Writes a cgroup file under root"""
+    path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(value + "\n")
+
+
+######################################################################
+#  G U N I C O R N   C O N F I G   T E S T   C A S E S
+######################################################################
+class TestGunicornConfig(TestCase):
+    """Gunicorn Configuration Tests"""
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.root = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        importlib.reload(gunicorn_config)
+
+    def test_cgroup_v2(self):
+        """It should read the limits of a cgroup v2"""
+        write(self.root, "cpu.max", "50000 100000")
+        write(self.root, "memory.max", str(128 * MEBIBYTE))
+        self.assertEqual(cpu_limit(self.root), 0.5)
+        self.assertEqual(memory_limit(self.root), 128 * MEBIBYTE)
+
+    def test_cgroup_v2_unlimited(self):
+        """It should find no limits in an unlimited cgroup v2"""
+        write(self.root, "cpu.max", "max 100000")
+        write(self.root, "memory.max", "max")
+        self.assertIsNone(cpu_limit(self.root))
+        self.assertIsNone(memory_limit(self.root))
+
+    def test_cgroup_v1(self):
+        """It should read the limits of a cgroup v1"""
+        write(self.root, "cpu/cpu.cfs_quota_us", "150000")
+        write(self.root, "cpu/cpu.cfs_period_us", "100000")
+        write(self.root, "memory/memory.limit_in_bytes", str(256 * MEBIBYTE))
+        self.assertEqual(cpu_limit(self.root), 1.5)
+        self.assertEqual(memory_limit(self.root), 256 * MEBIBYTE)
+        write(self.root, "cpu/cpu.cfs_quota_us", "-1")
+        write(self.root, "memory/memory.limit_in_bytes", "9223372036854771712")
+        self.assertIsNone(cpu_limit(self.root))
+        self.assertIsNone(memory_limit(self.root))
+
+    def test_available_cpus(self):
+        """It should use the cgroup's CPUs rather than the host's"""
+        self.assertGreaterEqual(available_cpus(self.root), 1)
+        write(self.root, "cpu.max", "25000 100000")
+        self.assertEqual(available_cpus(self.root), 0.25)
+
+    def test_worker_count(self):
+        """It should size the workers by CPU and memory"""
+        self.assertEqual(worker_count(0.5, None, 48 * MEBIBYTE, 32 * MEBIBYTE), 2)
+        self.assertEqual(worker_count(4, None, 48 * MEBIBYTE, 32 * MEBIBYTE), 9)
+        self.assertEqual(worker_count(4, 128 * MEBIBYTE, 48 * MEBIBYTE, 32 * MEBIBYTE), 2)
+        self.assertEqual(worker_count(4, 64 * MEBIBYTE, 48 * MEBIBYTE, 32 * MEBIBYTE), 1)
+
+    def test_settings_from_environment(self):
+        """It should let GUNICORN_* variables override the settings"""
+        env = {"GUNICORN_WORKERS": "3", "GUNICORN_WORKER_CLASS": "sync", "PORT": "9090"}
+        with patch.dict(os.environ, env):
+            os.environ.pop("GUNICORN_BIND", None)
+            config = importlib.reload(gunicorn_config)
+        self.assertEqual(config.workers, 3)
+        self.assertEqual(config.threads, 1)
+        self.assertEqual(config.bind, "0.0.0.0:9090")
+        self.assertEqual(config.max_requests, 1000)
+        self.assertGreater(config.max_requests_jitter, 0)
@@ -0,0 +1,113 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the JSON Providers
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import patch
+from flask import Flask, request
+from service.common import json_provider
+from service.common.json_provider import OrjsonProvider, StdlibJSONProvider, TypedJSONRequest
+from service.common.order_status import Status
+
+DOCUMENT = {
+    "price": Decimal("19.99"),
+    "status": Status.SHIPPED,
+    "created_at": datetime(2025, 1, 2, 3, 4, 5, 6000),
+    "day": date(2025, 1, 2),
+    "orderitem": [{"quantity": 2}],
+}
+
+ENCODED = {
+    "price": "19.99",
+    "status": "SHIPPED",
+    "created_at": "2025-01-02T03:04:05.006000",
+    "day": "2025-01-02",
+    "orderitem": [{"quantity": 2}],
+}
+
+BODY = '{"price": 19.99, "status": "shipped", "created_at": "2025-01-02T03:04:05", ' \
+    '"updated_at": "yesterday", "orderitem": [{"price": 0.1, "quantity": 2}]}'
+
+
+######################################################################
+#  J S O N   P R O V I D E R   T E S T   C A S E S
+######################################################################
+class TestJSONProviders(TestCase):
+    """JSON Provider Tests"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+
+    def _check_provider(self, provider):
+        self.assertEqual(provider.loads(provider.dumps(DOCUMENT)), ENCODED)
+        data = provider.loads_typed(BODY)
+        self.assertEqual(data["price"], Decimal("19.99"))
+        self.assertEqual(data["status"], Status.SHIPPED)
+        self.assertEqual(data["created_at"], datetime(2025, 1, 2, 3, 4, 5))
+        self.assertEqual(data["updated_at"], "yesterday")
+        self.assertEqual(data["orderitem"][0]["price"], Decimal("0.1"))
+        self.assertEqual(data["orderitem"][0]["quantity"], 2)
+        self.assertRaises(TypeError, provider.dumps, {"x": object()})
+
+    def test_stdlib_provider(self):
+        """It should encode and decode model types with the stdlib"""
+        self._check_provider(StdlibJSONProvider(self.app))
+
+    def test_orjson_provider(self):
+        """It should encode and decode model types with orjson"""
+        provider = OrjsonProvider(self.app)
+        self._check_provider(provider)
+        self.assertEqual(provider.dumps({"b": 1, "a": 2}, sort_keys=True), '{"a":2,"b":1}')
+        self.assertIn("\n", provider.dumps({"a": 1}, indent=2))
+        with self.app.app_context():
+            response = provider.response(DOCUMENT)
+        self.assertEqual(response.mimetype, "application/json")
+        self.assertEqual(provider.loads(response.get_data()), ENCODED)
+
+    def test_select_provider(self):
+        """It should install the configured provider"""
+        self.app.config["JSON_PROVIDER"] = "stdlib"
+        json_provider.init_app(self.app)
+        self.assertIsInstance(self.app.json, StdlibJSONProvider)
+        self.assertIs(self.app.request_class, TypedJSONRequest)
+
+    def test_auto_without_orjson(self):
+        """It should fall back to the stdlib when orjson is missing"""
+        with patch.object(json_provider, "orjson", None):
+            json_provider.init_app(self.app)
+            self.assertIsInstance(self.app.json, StdlibJSONProvider)
+            self.app.config["JSON_PROVIDER"] = "orjson"
+            self.assertRaises(RuntimeError, json_provider.init_app, self.app)
+
+    def test_request_get_json(self):
+        """It should decode request bodies into model types"""
+        json_provider.init_app(self.app)
+        with self.app.test_request_context(data=BODY, content_type="application/json"):
+            data = request.get_json()
+            self.assertEqual(data["status"], Status.SHIPPED)
+            self.assertEqual(data["price"], Decimal("19.99"))
+            self.assertEqual(request.json_module.dumps({"a": Decimal("1.10")}), '{"a":"1.10"}')
+
+    def test_request_outside_flask(self):
+        """It should decode with the current app when Flask did not set a provider"""
+        json_provider.init_app(self.app)
+        with self.app.app_context():
+            req = TypedJSONRequest.from_values(data=BODY, content_type="application/json")
+            self.assertEqual(req.get_json()["status"], Status.SHIPPED)
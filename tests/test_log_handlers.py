@@ -0,0 +1,153 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the Log Handlers
+"""
+import json
+import atexit
+import logging
+import threading
+from unittest import TestCase
+from flask import Flask
+from service.common import log_handlers
+from service.common.log_handlers import JsonFormatter, SamplingFilter, init_logging
+from tests.factories import OrderFactory
+
+GUNICORN_LOGGER = "test.gunicorn"
+LOGGERS = ("test.gunicorn", "flask.app", "flask.app.lookups")
+
+
+class Collector(logging.Handler):
+    """Keeps the lines it is given and the threads that formatted them"""
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+        self.threads.add(threading.current_thread().name)
+
+
+def make_app(**config):
+    """Returns a bare Flask app with the given logging settings"""
+    app = Flask("logtest")
+    app.config.update(config)
+    return app
+
+
+######################################################################
+#  L O G   H A N D L E R S   T E S T   C A S E S
+######################################################################
+class TestLogHandlers(TestCase):
+    """Log Handlers Tests"""
+
+    def setUp(self):
+        self.saved = {
+            name: (logger.handlers, logger.filters[:], logger.propagate, logger.level)
+            for name, logger in ((name, logging.getLogger(name)) for name in LOGGERS)
+        }
+        self.collector = Collector()
+        gunicorn = logging.getLogger(GUNICORN_LOGGER)
+        gunicorn.handlers = [self.collector]
+        gunicorn.setLevel(logging.INFO)
+
+    def tearDown(self):
+        for name, (handlers, filters, propagate, level) in self.saved.items():
+            logger = logging.getLogger(name)
+            logger.handlers, logger.filters, logger.propagate = handlers, filters, propagate
+            logger.setLevel(level)
+
+    def test_text(self):
+        """It should write the modules' records through gunicorn's handlers"""
+        init_logging(make_app(), GUNICORN_LOGGER)
+        logging.getLogger("flask.app").info("Processing %s", "x")
+        self.assertEqual(len(self.collector.lines), 2)
+        self.assertTrue(self.collector.lines[-1].endswith("[test_log_handlers] Processing x"))
+
+    def test_json(self):
+        """It should write one JSON object per line"""
+        init_logging(make_app(LOG_FORMAT="json"), GUNICORN_LOGGER)
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            logging.getLogger("flask.app").exception("Failed %d times", 2)
+        entry = json.loads(self.collector.lines[-1])
+        self.assertEqual(entry["message"], "Failed 2 times")
+        self.assertEqual(entry["level"], "ERROR")
+        self.assertEqual(entry["logger"], "flask.app")
+        self.assertIn("ValueError: bad", entry["exception"])
+        self.assertTrue(entry["time"].endswith("+00:00"))
+
+    def test_queue(self):
+        """It should format and write the records in a background thread"""
+        app = make_app(LOG_QUEUE=True)
+        init_logging(app, GUNICORN_LOGGER)
+        listener = app.extensions["log_listener"]
+        order = OrderFactory(customer_id="User0001")
+        logging.getLogger("flask.app").info("Creating %s", order)
+        order.customer_id = "changed"
+        listener.stop()
+        atexit.unregister(listener.stop)
+        self.assertEqual(len(self.collector.lines), 2)
+        self.assertIn("customer_id=User0001", self.collector.lines[-1])
+        self.assertNotIn(threading.current_thread().name, self.collector.threads)
+
+    def test_restart_listener(self):
+        """It should start a new listener on the same queue after a fork"""
+        app = make_app(LOG_QUEUE=True)
+        init_logging(app, GUNICORN_LOGGER)
+        first = app.extensions["log_listener"]
+        first.stop()
+        log_handlers.restart_listener(app)
+        second = app.extensions["log_listener"]
+        self.assertIsNot(first, second)
+        self.assertIs(first.queue, second.queue)
+        logging.getLogger("flask.app").info("after fork")
+        second.stop()
+        atexit.unregister(second.stop)
+        self.assertTrue(self.collector.lines[-1].endswith("after fork"))
+        log_handlers.restart_listener(make_app())
+
+    def test_sampling(self):
+        """It should keep one in N records of a sampled logger, and all warnings"""
+        app = make_app(LOG_SAMPLING={"flask.app.lookups": 10})
+        init_logging(app, GUNICORN_LOGGER)
+        init_logging(app, GUNICORN_LOGGER)
+        lookups = logging.getLogger("flask.app.lookups")
+        self.assertEqual(len([f for f in lookups.filters if isinstance(f, SamplingFilter)]), 1)
+        before = len(self.collector.lines)
+        for i in range(30):
+            lookups.info("Processing lookup for id %s ...", i)
+        lookups.warning("slow")
+        self.assertEqual(len(self.collector.lines) - before, 4)
+
+    def test_no_gunicorn_handlers(self):
+        """It should leave the modules' loggers alone outside gunicorn"""
+        logging.getLogger(GUNICORN_LOGGER).handlers = []
+        flask_app_logger = logging.getLogger("flask.app")
+        handlers = flask_app_logger.handlers
+        init_logging(make_app(LOG_QUEUE=True), GUNICORN_LOGGER)
+        self.assertIs(flask_app_logger.handlers, handlers)
+
+    def test_formatter_without_exception(self):
+        """It should leave out the exception when there is none"""
+        record = logging.LogRecord("flask.app", logging.INFO, __file__, 1, "hello %s", ("world",), None)
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry["message"], "hello world")
+        self.assertNotIn("exception", entry)
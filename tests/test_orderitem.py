@@ -93,6 +93,23 @@ class TestOrder(TestCase):
         self.assertEqual(len(new_order.orderitem), 2)
         self.assertEqual(new_order.orderitem[1].product_id, orderitem2.product_id)
 
+    def test_items_in_id_order(self):
+        """It should load the items of an Order in id order"""
+        order = OrderFactory()
+        for _ in range(3):
+            order.orderitem.append(OrderItemFactory(order=order))
+        order.create()
+        # an UPDATE moves the first item to the end of the heap
+        order.orderitem[0].quantity += 1
+        order.update()
+        ids = sorted(item.id for item in order.orderitem)
+        db.session.remove()
+
+        self.assertEqual([item.id for item in Order.find(order.id).orderitem], ids)
+        db.session.remove()
+        found = Order.find_filtered()
+        self.assertEqual([item.id for item in found[0].orderitem], ids)
+
     def test_line_amount_computed(self):
         """It should compute line_amount as price multiplied by quantity for an OrderItem"""
 
@@ -51,11 +51,16 @@ class TestOrderService(TestCase):
         # Set up the test database
         app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URI
         app.logger.setLevel(logging.CRITICAL)
+        # fail any request that runs the same statement three times
+        app.config["SQL_N_PLUS_ONE_RAISE"] = True
+        app.config["SQL_REPEAT_THRESHOLD"] = 3
         app.app_context().push()
 
     @classmethod
     def tearDownClass(cls):
         """Runs once before test suite"""
+        app.config["SQL_N_PLUS_ONE_RAISE"] = False
+        app.config["SQL_REPEAT_THRESHOLD"] = 5
         db.session.close()
 
     def setUp(self):
@@ -188,6 +193,26 @@ class TestOrderService(TestCase):
         updated = resp.get_json()
         self.assertEqual(updated["status"], "SHIPPED")
 
+    def test_write_matches_read(self):
+        """It should answer a write with the values a read returns"""
+        order = OrderFactory()
+        body = order.serialize()
+        body["orderitem"] = [{"order_id": 0, "product_id": "P1", "price": "10.129", "quantity": 3}]
+        resp = self.client.post(BASE_URL, json=body)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        created = resp.get_json()
+        self.assertEqual(created["orderitem"][0]["price"], "10.13")
+        self.assertEqual(created["total_amount"], "30.39")
+        self.assertEqual(created, self.client.get(f"{BASE_URL}/{created['id']}").get_json())
+
+        created["orderitem"][0]["price"] = "2.005"
+        del created["orderitem"][0]["line_amount"]
+        resp = self.client.put(f"{BASE_URL}/{created['id']}", json=created)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        updated = resp.get_json()
+        self.assertEqual(updated["total_amount"], "6.03")
+        self.assertEqual(updated, self.client.get(f"{BASE_URL}/{created['id']}").get_json())
+
     def test_delete_order(self):
         """It should Delete an Order"""
         test_order = self._create_orders(1)[0]
@@ -0,0 +1,96 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the Compiled Serializers
+"""
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import TestCase
+from flask_restx import Model, fields, marshal
+from service.api.orders import order_model, order_item_model
+from service.api.serializers import serializer_for
+from tests.factories import OrderFactory, OrderItemFactory
+
+address_model = Model("Address", {
+    "city": fields.String,
+})
+
+thing_model = Model("Thing", {
+    "count": fields.Integer,
+    "ratio": fields.Float,
+    "active": fields.Boolean,
+    "price": fields.Fixed(decimals=2),
+    "label": fields.String(default="none"),
+    "city": fields.String(attribute="address.city"),
+    "first_tag": fields.String(attribute="tags.0"),
+    "seen": fields.DateTime(dt_format="rfc822"),
+    "seen_iso": fields.DateTime(attribute="when.seen"),
+    "address": fields.Nested(address_model),
+    "addresses": fields.List(fields.Nested(address_model)),
+    "tags": fields.List(fields.String),
+})
+
+
+######################################################################
+#  S E R I A L I Z E R   T E S T   C A S E S
+######################################################################
+class TestSerializers(TestCase):
+    """Compiled Serializer Tests"""
+
+    def test_order_matches_marshal(self):
+        """It should serialize an Order exactly like marshal"""
+        order = OrderFactory()
+        OrderItemFactory.create_batch(3, order=order)
+        self.assertEqual(serializer_for(order_model)(order), marshal(order, order_model))
+
+    def test_order_item_matches_marshal(self):
+        """It should serialize an OrderItem exactly like marshal"""
+        item = OrderItemFactory()
+        self.assertEqual(serializer_for(order_item_model)(item), marshal(item, order_item_model))
+
+    def test_compiled_once(self):
+        """It should compile each model only once"""
+        self.assertIs(serializer_for(order_model), serializer_for(order_model))
+
+    def test_other_field_types(self):
+        """It should match marshal for the other field types"""
+        thing = SimpleNamespace(
+            count="3",
+            ratio=0.5,
+            active=1,
+            price=Decimal("1.5"),
+            label=None,
+            address=SimpleNamespace(city="Paris"),
+            addresses=[SimpleNamespace(city="Rome")],
+            tags=["a", "b"],
+            seen=datetime(2025, 1, 2, 3, 4, 5),
+            when=SimpleNamespace(seen=datetime(2025, 1, 2, 3, 4, 5)),
+        )
+        self.assertEqual(serializer_for(thing_model)(thing), dict(marshal(thing, thing_model)))
+
+    def test_null_values(self):
+        """It should keep null values null"""
+        thing = SimpleNamespace(
+            count=None, ratio=None, active=None, price=None, label=None, address=None,
+            addresses=None, tags=None, seen=None, when=None,
+        )
+        data = serializer_for(thing_model)(thing)
+        self.assertIsNone(data["count"])
+        self.assertIsNone(data["address"])
+        self.assertIsNone(data["addresses"])
+        self.assertEqual(data["label"], "none")